@@ -16,5 +16,17 @@ Dilopad - Digital Logic Scratchpad and Simulator
 
 __version__ = (0, 0, 0)
 
-__all__ = ['boolean', 'device', 'truth']
+__all__ = ['aig', 'boolean', 'coverage', 'device', 'fault', 'optimize',
+           'parallel', 'sat', 'spatial', 'truth']
 __name__ = 'dilo'
+
+
+def __getattr__(name):
+    """\
+    Import submodules lazily on first attribute access (Python 3.7+), so that
+    importing the package alone imports nothing else.
+    """
+    if name in __all__ or name in ('devices', 'interface', 'server'):
+        from importlib import import_module
+        return import_module('%s.%s' % (__name__, name))
+    raise AttributeError('module %s has no attribute %s' % (__name__, name))
@@ -0,0 +1,391 @@
+  #   #               #
+  #   #               #
+### # # ### ### ### ###
+# # # # # # # # # # # #
+### # # ### ###  ## ###
+            #
+            #
+
+"""\
+And-Inverter Graph module.
+
+An And-Inverter Graph (AIG) represents combinational logic as two-input AND
+nodes connected by possibly complemented edges. Nodes are stored in flat
+integer arrays and hash-consed, so structurally identical logic is shared.
+Edges are literals: twice the node index, plus one if complemented. Node 0 is
+constant false, so literals 0 and 1 are the constants false and true.
+
+@author: Aaron Mavrinac
+@contact: mavrinac@gmail.com
+@license: GPL-3
+"""
+
+__all__ = ['AIG']
+
+from array import array
+
+from .boolean import Algebra, _NAMES
+from .device import Circuit
+from .devices.basic import Logic0, Logic1, Buffer, Inverter
+from .devices.gates import ANDGate
+
+FALSE, TRUE = 0, 1
+
+
+class AIG(Algebra):
+    """\
+    And-Inverter Graph class. Literals are the operands of its algebra.
+    """
+    def __init__(self):
+        """\
+        Constructor.
+        """
+        # fanin literals of each node; inputs and the constant have none (-1)
+        self._left = array('l', [-1])
+        self._right = array('l', [-1])
+        self._strash = {}
+        self._inputs = {}
+        self._outputs = {}
+
+    def __len__(self):
+        """\
+        Return the number of AND nodes in the graph.
+        """
+        return len(self._left) - len(self._inputs) - 1
+
+    @property
+    def inputs(self):
+        """\
+        A list of the inputs to this graph.
+        """
+        inputs = list(self._inputs.keys())
+        inputs.sort()
+        return inputs
+
+    @property
+    def outputs(self):
+        """\
+        A list of the outputs from this graph.
+        """
+        outputs = list(self._outputs.keys())
+        outputs.sort()
+        return outputs
+
+    def input(self, name):
+        """\
+        Get the literal of an input, adding the input if necessary.
+
+        @param name: The input name.
+        @type name: C{str}
+        @return: The input literal.
+        @rtype: C{int}
+        """
+        try:
+            return self._inputs[name]
+        except KeyError:
+            self._left.append(-1)
+            self._right.append(-1)
+            self._inputs[name] = 2 * (len(self._left) - 1)
+            return self._inputs[name]
+
+    def output(self, name):
+        """\
+        Get the literal of an output.
+
+        @param name: The output name.
+        @type name: C{str}
+        @return: The output literal.
+        @rtype: C{int}
+        """
+        try:
+            return self._outputs[name]
+        except KeyError:
+            raise KeyError('no output %s' % name)
+
+    def set_output(self, name, literal):
+        """\
+        Set an output to a literal.
+
+        @param name: The output name.
+        @type name: C{str}
+        @param literal: The literal.
+        @type literal: C{int}
+        """
+        self._outputs[name] = literal
+
+    def fanins(self, literal):
+        """\
+        Get the fanin literals of the node of a literal.
+
+        @param literal: The literal.
+        @type literal: C{int}
+        @return: The fanin literals, or C{None} for an input or constant.
+        @rtype: C{tuple} of C{int}
+        """
+        node = literal >> 1
+        if self._left[node] < 0:
+            return None
+        return self._left[node], self._right[node]
+
+    def AND(self, a, b):
+        """\
+        Get the literal of the conjunction of two literals, adding a node if
+        an identical one does not already exist.
+
+        @param a: The first literal.
+        @type a: C{int}
+        @param b: The second literal.
+        @type b: C{int}
+        @return: The conjunction literal.
+        @rtype: C{int}
+        """
+        if a > b:
+            a, b = b, a
+        if a == FALSE or a == b ^ 1:
+            return FALSE
+        if a == TRUE or a == b:
+            return b
+        try:
+            return self._strash[(a, b)]
+        except KeyError:
+            self._left.append(a)
+            self._right.append(b)
+            self._strash[(a, b)] = 2 * (len(self._left) - 1)
+            return self._strash[(a, b)]
+
+    def OR(self, a, b):
+        """\
+        Get the literal of the disjunction of two literals.
+        """
+        return self.AND(a ^ 1, b ^ 1) ^ 1
+
+    def XOR(self, a, b):
+        """\
+        Get the literal of the exclusive disjunction of two literals.
+        """
+        return self.OR(self.AND(a, b ^ 1), self.AND(a ^ 1, b))
+
+    def MUX(self, s, a, b):
+        """\
+        Get the literal selecting between two literals (C{a} if the selector
+        literal is false, C{b} if it is true).
+        """
+        return self.OR(self.AND(s ^ 1, a), self.AND(s, b))
+
+    def reduce(self, operator, literals, empty=TRUE):
+        """\
+        Combine a list of literals with a binary operator as a balanced tree.
+
+        @param operator: The operator method (e.g. C{aig.AND}).
+        @type operator: C{function}
+        @param literals: The literals to combine.
+        @type literals: C{list} of C{int}
+        @param empty: The result for an empty list.
+        @type empty: C{int}
+        @return: The combined literal.
+        @rtype: C{int}
+        """
+        literals = list(literals)
+        if not literals:
+            return empty
+        while len(literals) > 1:
+            literals = [operator(literals[i], literals[i + 1]) \
+                for i in range(0, len(literals) - 1, 2)] \
+                + literals[len(literals) & ~1:]
+        return literals[0]
+
+    def constant(self, value):
+        """\
+        Get the literal of a constant.
+        """
+        return value and TRUE or FALSE
+
+    def complement(self, a):
+        """\
+        Get the literal of the complement of a literal.
+        """
+        return a ^ 1
+
+    def conjunction(self, args):
+        """\
+        Get the literal of the conjunction of a list of literals.
+        """
+        return self.reduce(self.AND, args)
+
+    def disjunction(self, args):
+        """\
+        Get the literal of the disjunction of a list of literals.
+        """
+        return self.reduce(self.OR, args, empty=FALSE)
+
+    def parity(self, args):
+        """\
+        Get the literal of the exclusive disjunction of a list of literals.
+        """
+        return self.reduce(self.XOR, args, empty=FALSE)
+
+    select = MUX
+
+    def simulate(self, values, width=1):
+        """\
+        Simulate the graph bit-parallel, with each input value a word packing
+        one pattern per bit.
+
+        @param values: The input words, keyed by input name.
+        @type values: C{dict} of C{int}
+        @param width: The number of patterns packed in each word.
+        @type width: C{int}
+        @return: The output words, keyed by output name.
+        @rtype: C{dict} of C{int}
+        """
+        mask = (1 << width) - 1
+        words = [0] * len(self._left)
+        for name in self._inputs.keys():
+            words[self._inputs[name] >> 1] = int(values[name]) & mask
+        left, right = self._left, self._right
+        for node in range(1, len(left)):
+            if left[node] >= 0:
+                a, b = left[node], right[node]
+                words[node] = (words[a >> 1] ^ -(a & 1)) \
+                    & (words[b >> 1] ^ -(b & 1)) & mask
+        result = {}
+        for name in self._outputs.keys():
+            literal = self._outputs[name]
+            result[name] = words[literal >> 1]
+            if literal & 1:
+                result[name] ^= mask
+        return result
+
+    def evaluate(self, values):
+        """\
+        Evaluate the graph for a single input assignment.
+
+        @param values: The input values, keyed by input name.
+        @type values: C{dict} of C{bool}
+        @return: The output values, keyed by output name.
+        @rtype: C{dict} of C{bool}
+        """
+        result = self.simulate(values)
+        return dict((name, bool(result[name])) for name in result.keys())
+
+    def add_expression(self, expression):
+        """\
+        Add the logic of a Boolean expression, with its variables as inputs.
+        The compiled form of the expression is walked in topological order,
+        so that shared sub-expressions are added once.
+
+        @param expression: The Boolean expression.
+        @type expression: L{BooleanExpression}
+        @return: The expression literal.
+        @rtype: C{int}
+        """
+        compiled = expression.compiled
+        literals = {}
+        for node in compiled.cone(expression.root):
+            op, arg = compiled.nodes[node]
+            if op == 'var':
+                literals[node] = self.input(_NAMES[arg])
+            elif op == 'const':
+                literals[node] = self.constant(arg)
+            elif op == 'not':
+                literals[node] = literals[arg] ^ 1
+            elif op == 'and':
+                literals[node] = self.conjunction([literals[a] for a in arg])
+            else:
+                literals[node] = self.disjunction([literals[a] for a in arg])
+        return literals[node]
+
+    def add_circuit(self, circuit):
+        """\
+        Add the logic of a combinational circuit, with its inputs as inputs.
+        Unlabeled device inputs of a circuit with input labels are treated as
+        constants at their current values.
+
+        @param circuit: The circuit.
+        @type circuit: L{Circuit}
+        @return: The literals of the circuit outputs, keyed by output ID.
+        @rtype: C{dict} of C{int}
+        """
+        return circuit._evaluate([self.input(inputid) \
+            for inputid in circuit.inputs], self)
+
+    @classmethod
+    def from_expression(cls, expression, name='F'):
+        """\
+        Construct a graph from a Boolean expression.
+
+        @param expression: The Boolean expression.
+        @type expression: L{BooleanExpression}
+        @param name: The output name.
+        @type name: C{str}
+        @return: The graph.
+        @rtype: L{AIG}
+        """
+        aig = cls()
+        aig.set_output(name, aig.add_expression(expression))
+        return aig
+
+    @classmethod
+    def from_circuit(cls, circuit):
+        """\
+        Construct a graph from a combinational circuit.
+
+        @param circuit: The circuit.
+        @type circuit: L{Circuit}
+        @return: The graph.
+        @rtype: L{AIG}
+        """
+        aig = cls()
+        outputs = aig.add_circuit(circuit)
+        for outputid in outputs.keys():
+            aig.set_output(outputid, outputs[outputid])
+        return aig
+
+    def to_circuit(self):
+        """\
+        Construct a circuit of two-input AND gates and inverters from the
+        logic in the cone of the graph outputs. Each graph input is a labeled
+        buffer input.
+
+        @return: The circuit.
+        @rtype: L{Circuit}
+        """
+        circuit = Circuit()
+        inputs = dict((self._inputs[name] >> 1, name) \
+            for name in self._inputs.keys())
+        cone = set(inputs.keys())
+        stack = [self._outputs[name] >> 1 for name in self._outputs.keys()]
+        while stack:
+            node = stack.pop()
+            if node and not node in cone:
+                cone.add(node)
+                stack.extend([self._left[node] >> 1, self._right[node] >> 1])
+        nets = {}
+
+        def net(literal):
+            if not literal in nets:
+                if literal == FALSE or literal == TRUE:
+                    nets[literal] = literal and 'one' or 'zero'
+                    circuit.add(nets[literal], literal and Logic1() or Logic0())
+                else:
+                    nets[literal] = 'x%d' % (literal >> 1)
+                    circuit.add(nets[literal], Inverter())
+                    circuit.connect(nets[literal ^ 1], 'q', nets[literal], 'a')
+            return nets[literal]
+
+        # nodes are numbered in topological order
+        for node in sorted(cone):
+            if node in inputs:
+                nets[2 * node] = 'i%d' % node
+                circuit.add(nets[2 * node], Buffer())
+                circuit.label_inputs(inputs[node], ['i%d.a' % node])
+            else:
+                nets[2 * node] = 'n%d' % node
+                circuit.add(nets[2 * node], ANDGate())
+                circuit.connect(net(self._left[node]), 'q', nets[2 * node],
+                                'a')
+                circuit.connect(net(self._right[node]), 'q', nets[2 * node],
+                                'b')
+        for name in self._outputs.keys():
+            circuit.label_output(name, '%s.q' % net(self._outputs[name]))
+        return circuit
@@ -14,12 +14,14 @@ Boolean algebra module.
 @license: GPL-3
 """
 
-__all__ = ['BooleanExpression']
+__all__ = ['Algebra', 'BooleanExpression', 'CompiledExpression',
+           'compile_expression', 'intern_variable']
 
+from collections import OrderedDict
 from re import sub
-from pyparsing import Word, alphas, oneOf, operatorPrecedence, opAssoc
 
-VALUES = {}
+# maximum number of compiled expressions cached
+CACHE_SIZE = 256
 
 class BooleanOperator(object):
     def __init__(self, t):
@@ -30,46 +32,363 @@ class BooleanOperator(object):
 
 class BooleanAnd(BooleanOperator):
     symbol = '*'
-    def __nonzero__(self):
-        for a in self.args:
-            if isinstance(a, basestring):
-                v = VALUES[a]
-            else:
-                v = bool(a)
-            if not v:
-                return False
-        return True
 
 class BooleanOr(BooleanOperator):
     symbol = '+'
-    def __nonzero__(self):
-        for a in self.args:
-            if isinstance(a, basestring):
-                v = VALUES[a]
-            else:
-                v = bool(a)
-            if v:
-                return True
-        return False
 
 class BooleanNot(BooleanOperator):
     def __init__(self, t):
         self.arg = t[0][0]
     def __str__(self):
         return str(self.arg) + '\''
-    def __nonzero__(self):
-        if isinstance(self.arg, basestring):
-            v = VALUES[self.arg]
-        else:
-            v = bool(self.arg)
-        return not v
 
-BooleanOperand = Word(alphas, max=1) | oneOf('1 0')
+BooleanAlgebra = None
+
+
+def grammar():
+    """\
+    Return the Boolean algebra grammar, constructing it on first use so that
+    importing this module does not import pyparsing.
+    """
+    global BooleanAlgebra
+    if BooleanAlgebra is None:
+        from pyparsing import ParserElement, Word, alphas, alphanums, oneOf, \
+            infixNotation, opAssoc
+        # memoize partial matches, which nested operators otherwise retry
+        # exponentially often
+        ParserElement.enablePackrat()
+        BooleanOperand = Word(alphas + '_', alphanums + '_') | oneOf('1 0')
+        BooleanAlgebra = infixNotation(BooleanOperand,
+            [('!', 1, opAssoc.LEFT, BooleanNot),
+             ('*', 2, opAssoc.LEFT, BooleanAnd),
+             ('+', 2, opAssoc.LEFT, BooleanOr)])
+    return BooleanAlgebra
+
+
+_INDICES = {}
+_NAMES = []
+
+
+def intern_variable(name):
+    """\
+    Return the interned integer index of a variable name, shared by all
+    expressions.
+
+    @param name: The variable name.
+    @type name: C{str}
+    @return: The index.
+    @rtype: C{int}
+    """
+    try:
+        return _INDICES[name]
+    except KeyError:
+        _INDICES[name] = len(_NAMES)
+        _NAMES.append(name)
+        return _INDICES[name]
+
+
+class Algebra(object):
+    """\
+    Boolean algebra interface. Devices describe their logic in terms of these
+    operations, so that the same description may be evaluated on values,
+    compiled into expressions, or added to an And-Inverter Graph. Operands are
+    whatever the implementation uses to represent a signal.
+    """
+    def constant(self, value):
+        """\
+        Return the operand of a constant.
+
+        @param value: The constant value.
+        @type value: C{bool}
+        """
+        raise NotImplementedError('constant method must be overridden')
+
+    def complement(self, a):
+        """\
+        Return the operand of the complement of an operand.
+        """
+        raise NotImplementedError('complement method must be overridden')
+
+    def conjunction(self, args):
+        """\
+        Return the operand of the conjunction of a list of operands.
+        """
+        raise NotImplementedError('conjunction method must be overridden')
+
+    def disjunction(self, args):
+        """\
+        Return the operand of the disjunction of a list of operands.
+        """
+        raise NotImplementedError('disjunction method must be overridden')
+
+    def parity(self, args):
+        """\
+        Return the operand of the exclusive disjunction of a list of operands.
+        """
+        result = self.constant(False)
+        for a in args:
+            result = self.disjunction([
+                self.conjunction([result, self.complement(a)]),
+                self.conjunction([self.complement(result), a])])
+        return result
+
+    def select(self, s, a, b):
+        """\
+        Return the operand of a multiplexer, selecting the second operand if
+        the selector is false and the third if it is true.
+        """
+        return self.disjunction([self.conjunction([self.complement(s), a]),
+                                 self.conjunction([s, b])])
+
+
+class CompiledExpression(Algebra):
+    """\
+    Compiled Boolean expression class. Sub-expressions are hash-consed into a
+    directed acyclic graph of nodes, numbered in topological order, so that
+    each distinct sub-expression is evaluated once per assignment. Nodes are
+    normalized as they are built: nested conjunctions and disjunctions are
+    flattened, their arguments sorted and deduplicated, constants folded,
+    complementary arguments and double negations eliminated.
+    """
+    def __init__(self):
+        """\
+        Constructor.
+        """
+        self.nodes = []
+        self.root = None
+        self._table = {}
+        self._cones = {}
+
+    def _node(self, key):
+        """\
+        Return the index of a node, adding it if it does not already exist.
+        """
+        try:
+            return self._table[key]
+        except KeyError:
+            self._table[key] = len(self.nodes)
+            self.nodes.append(key)
+            return self._table[key]
+
+    def variable(self, name):
+        """\
+        Return the node of a variable.
+
+        @param name: The variable name.
+        @type name: C{str}
+        @rtype: C{int}
+        """
+        return self._node(('var', intern_variable(name)))
+
+    def constant(self, value):
+        """\
+        Return the node of a constant.
+
+        @param value: The constant value.
+        @type value: C{bool}
+        @rtype: C{int}
+        """
+        return self._node(('const', bool(value)))
+
+    def NOT(self, a):
+        """\
+        Return the node of the complement of a node.
+
+        @param a: The node.
+        @type a: C{int}
+        @rtype: C{int}
+        """
+        op, arg = self.nodes[a]
+        if op == 'not':
+            return arg
+        elif op == 'const':
+            return self.constant(not arg)
+        return self._node(('not', a))
 
-BooleanAlgebra = operatorPrecedence(BooleanOperand,
-    [('!', 1, opAssoc.LEFT, BooleanNot),
-     ('*', 2, opAssoc.LEFT, BooleanAnd),
-     ('+', 2, opAssoc.LEFT, BooleanOr)])
+    def _combine(self, op, args):
+        """\
+        Return the node of a conjunction or disjunction of nodes.
+        """
+        absorbing = op == 'or'
+        flat = set()
+        for a in args:
+            if self.nodes[a][0] == op:
+                flat.update(self.nodes[a][1])
+            elif self.nodes[a][0] == 'const':
+                if self.nodes[a][1] == absorbing:
+                    return self.constant(absorbing)
+            else:
+                flat.add(a)
+        for a in flat:
+            if self.nodes[a][0] == 'not' and self.nodes[a][1] in flat:
+                return self.constant(absorbing)
+        if not flat:
+            return self.constant(not absorbing)
+        elif len(flat) == 1:
+            return flat.pop()
+        return self._node((op, tuple(sorted(flat))))
+
+    def AND(self, args):
+        """\
+        Return the node of the conjunction of nodes.
+
+        @param args: The nodes.
+        @type args: C{list} of C{int}
+        @rtype: C{int}
+        """
+        return self._combine('and', args)
+
+    def OR(self, args):
+        """\
+        Return the node of the disjunction of nodes.
+
+        @param args: The nodes.
+        @type args: C{list} of C{int}
+        @rtype: C{int}
+        """
+        return self._combine('or', args)
+
+    complement = NOT
+    conjunction = AND
+    disjunction = OR
+
+    def build(self, tree):
+        """\
+        Add the nodes of a parse tree.
+
+        @param tree: The root of the parse tree.
+        @type tree: L{BooleanOperator} or C{str}
+        @return: The root node.
+        @rtype: C{int}
+        """
+        if isinstance(tree, BooleanNot):
+            return self.NOT(self.build(tree.arg))
+        elif isinstance(tree, BooleanAnd):
+            return self.AND([self.build(arg) for arg in tree.args])
+        elif isinstance(tree, BooleanOr):
+            return self.OR([self.build(arg) for arg in tree.args])
+        elif tree in ('0', '1'):
+            return self.constant(tree == '1')
+        return self.variable(tree)
+
+    def cone(self, root=None):
+        """\
+        Return the nodes on which a node depends, in topological order.
+
+        @param root: The node (defaults to the root).
+        @type root: C{int}
+        @rtype: C{list} of C{int}
+        """
+        if root is None:
+            root = self.root
+        if not root in self._cones:
+            cone, stack = set(), [root]
+            while stack:
+                node = stack.pop()
+                if not node in cone:
+                    cone.add(node)
+                    op, arg = self.nodes[node]
+                    if op == 'not':
+                        stack.append(arg)
+                    elif op in ('and', 'or'):
+                        stack.extend(arg)
+            self._cones[root] = sorted(cone)
+        return self._cones[root]
+
+    def variables(self, root=None):
+        """\
+        Return the variables on which a node depends.
+
+        @param root: The node (defaults to the root).
+        @type root: C{int}
+        @return: Sorted list of variable names.
+        @rtype: C{list} of C{str}
+        """
+        variables = [_NAMES[self.nodes[node][1]] for node in self.cone(root) \
+            if self.nodes[node][0] == 'var']
+        variables.sort()
+        return variables
+
+    def evaluate(self, values, root=None):
+        """\
+        Evaluate a node.
+
+        @param values: The variable values, keyed by variable name.
+        @type values: C{dict} of C{bool}
+        @param root: The node (defaults to the root).
+        @type root: C{int}
+        @rtype: C{bool}
+        """
+        nodes, results = self.nodes, {}
+        for node in self.cone(root):
+            op, arg = nodes[node]
+            if op == 'var':
+                result = bool(values[_NAMES[arg]])
+            elif op == 'const':
+                result = arg
+            elif op == 'not':
+                result = not results[arg]
+            elif op == 'and':
+                result = True
+                for a in arg:
+                    if not results[a]:
+                        result = False
+                        break
+            else:
+                result = False
+                for a in arg:
+                    if results[a]:
+                        result = True
+                        break
+            results[node] = result
+        return result
+
+    def render(self, root=None):
+        """\
+        Render a node as expression text.
+
+        @param root: The node (defaults to the root).
+        @type root: C{int}
+        @rtype: C{str}
+        """
+        texts = {}
+        for node in self.cone(root):
+            op, arg = self.nodes[node]
+            if op == 'var':
+                texts[node] = _NAMES[arg]
+            elif op == 'const':
+                texts[node] = arg and '1' or '0'
+            elif op == 'not':
+                texts[node] = texts[arg] + '\''
+            else:
+                texts[node] = '(' + (op == 'and' and ' * ' or ' + ').join(\
+                    [texts[a] for a in arg]) + ')'
+        return texts[node]
+
+
+_CACHE = OrderedDict()
+
+
+def compile_expression(text):
+    """\
+    Compile Boolean expression text, using a least-recently-used cache of
+    compiled expressions shared by all expressions.
+
+    @param text: The expression text.
+    @type text: C{str}
+    @return: The compiled expression.
+    @rtype: L{CompiledExpression}
+    """
+    try:
+        compiled = _CACHE.pop(text)
+    except KeyError:
+        compiled = CompiledExpression()
+        compiled.root = compiled.build(\
+            grammar().parseString(sub('\'', '!', text))[0])
+        if len(_CACHE) >= CACHE_SIZE:
+            _CACHE.popitem(last=False)
+    _CACHE[text] = compiled
+    return compiled
 
 
 class BooleanExpression(object):
@@ -79,8 +398,72 @@ class BooleanExpression(object):
     def __init__(self, expression):
         self.expression = expression
 
+    @classmethod
+    def _from_builder(cls, compiled, root):
+        """\
+        Construct an expression from a node of a compiled expression. The
+        expression text is only rendered when first requested.
+
+        @param compiled: The compiled expression containing the node.
+        @type compiled: L{CompiledExpression}
+        @param root: The node.
+        @type root: C{int}
+        @rtype: L{BooleanExpression}
+        """
+        expression = cls.__new__(cls)
+        expression._expression = None
+        expression._compiled = compiled
+        expression._root = root
+        return expression
+
+    @property
+    def expression(self):
+        """\
+        The text of this expression.
+        """
+        if self._expression is None:
+            self._expression = self._compiled.render(self._root)
+        return self._expression
+
+    @expression.setter
+    def expression(self, value):
+        self._expression = value
+        self._compiled = None
+
+    @property
+    def compiled(self):
+        """\
+        The compiled form of this expression.
+        """
+        if self._compiled is not None:
+            return self._compiled
+        return compile_expression(self._expression)
+
+    @property
+    def root(self):
+        """\
+        The root node of this expression in its compiled form.
+        """
+        if self._compiled is not None:
+            return self._root
+        return self.compiled.root
+
+    @property
+    def variables(self):
+        """\
+        A sorted list of the variables in this expression.
+        """
+        return self.compiled.variables(self.root)
+
+    def parse(self):
+        """\
+        Parse this expression.
+
+        @return: The root of the parse tree, which is either an operator or a
+                 variable or constant string.
+        @rtype: L{BooleanOperator} or C{str}
+        """
+        return grammar().parseString(sub('\'', '!', self.expression))[0]
+
     def evaluate(self, values):
-        global VALUES
-        VALUES = values
-        res = BooleanAlgebra.parseString(sub('\'', '!', self.expression))[0]
-        return bool(res)
+        return self.compiled.evaluate(values, self.root)
@@ -0,0 +1,225 @@
+  #   #               #
+  #   #               #
+### # # ### ### ### ###
+# # # # # # # # # # # #
+### # # ### ###  ## ###
+            #
+            #
+
+
+"""\
+Coverage collection module.
+
+@author: Aaron Mavrinac
+@contact: mavrinac@gmail.com
+@license: GPL-3
+"""
+
+__all__ = ['Coverage']
+
+
+def _count(bits):
+    """\
+    Count the bits set in a bit array.
+
+    @param bits: The bit array.
+    @type bits: C{bytearray}
+    @rtype: C{int}
+    """
+    return sum([bin(byte).count('1') for byte in bits])
+
+
+class Coverage(object):
+    """\
+    Toggle and state coverage collector class. Each net, named by its source
+    device output, has a rising and a falling bit in a pair of packed bit
+    arrays, indexed by sorted net name; for bus nets, any increase or decrease
+    counts as a rise or fall. The observed values of each tracked port are
+    kept as sets. To collect coverage during simulation, assign a collector
+    to the C{coverage} attribute of a circuit.
+    """
+    def __init__(self, nets=[], inputs=[], outputs=[]):
+        """\
+        Constructor.
+
+        @param nets: The nets to track, named by device output.
+        @type nets: C{list} of C{str}
+        @param inputs: The input IDs to track.
+        @type inputs: C{list} of C{str}
+        @param outputs: The output IDs to track.
+        @type outputs: C{list} of C{str}
+        """
+        self._nets = []
+        self._indices = {}
+        self._rises = bytearray()
+        self._falls = bytearray()
+        self._reindex(nets)
+        self.inputs = dict((inputid, set()) for inputid in inputs)
+        self.outputs = dict((outputid, set()) for outputid in outputs)
+
+    @classmethod
+    def from_circuit(cls, circuit):
+        """\
+        Construct a collector tracking every net and labeled port of a
+        circuit.
+
+        @param circuit: The circuit.
+        @type circuit: L{Circuit}
+        @rtype: L{Coverage}
+        """
+        return cls(nets=['%s.%s' % net for net in circuit._cached_outputs],
+            inputs=list(circuit._inputs.keys()),
+            outputs=list(circuit._outputs.keys()))
+
+    def _reindex(self, nets):
+        """\
+        Track a new set of nets, keeping the bits of those already tracked.
+
+        @param nets: The nets to track.
+        @type nets: C{list} of C{str}
+        """
+        names = sorted(set(nets))
+        rises = bytearray((len(names) + 7) >> 3)
+        falls = bytearray((len(names) + 7) >> 3)
+        indices = {}
+        for i, name in enumerate(names):
+            indices[tuple(name.split('.', 1))] = i
+            if self._test(self._rises, name):
+                rises[i >> 3] |= 1 << (i & 7)
+            if self._test(self._falls, name):
+                falls[i >> 3] |= 1 << (i & 7)
+        self._nets, self._indices = names, indices
+        self._rises, self._falls = rises, falls
+
+    def _test(self, bits, name):
+        """\
+        Test the bit of a net in one of the bit arrays.
+
+        @param bits: The bit array.
+        @type bits: C{bytearray}
+        @param name: The net name.
+        @type name: C{str}
+        @rtype: C{bool}
+        """
+        i = self._indices.get(tuple(name.split('.', 1)))
+        return i is not None and bool(bits[i >> 3] & 1 << (i & 7))
+
+    @property
+    def nets(self):
+        """\
+        The sorted list of tracked nets.
+        """
+        return list(self._nets)
+
+    def toggle(self, net, previous, value):
+        """\
+        Record a change in the value of a net.
+
+        @param net: The (device ID, output ID) of the net.
+        @type net: C{tuple} of C{str}
+        @param previous: The previous value.
+        @type previous: C{bool} or C{int}
+        @param value: The new value.
+        @type value: C{bool} or C{int}
+        """
+        i = self._indices.get(net)
+        if i is None:
+            return
+        if value > previous:
+            self._rises[i >> 3] |= 1 << (i & 7)
+        elif value < previous:
+            self._falls[i >> 3] |= 1 << (i & 7)
+
+    def sample(self, circuit):
+        """\
+        Record the current values of the tracked ports of a circuit.
+
+        @param circuit: The circuit.
+        @type circuit: L{Circuit}
+        """
+        for inputid in self.inputs.keys():
+            if inputid in circuit._inputs:
+                self.inputs[inputid].add(circuit._get_input(inputid))
+        for outputid in self.outputs.keys():
+            if outputid in circuit._outputs:
+                self.outputs[outputid].add(circuit.get_output(outputid))
+
+    def rose(self, net):
+        """\
+        Check whether a net has risen.
+
+        @param net: The net name.
+        @type net: C{str}
+        @rtype: C{bool}
+        """
+        return self._test(self._rises, net)
+
+    def fell(self, net):
+        """\
+        Check whether a net has fallen.
+
+        @param net: The net name.
+        @type net: C{str}
+        @rtype: C{bool}
+        """
+        return self._test(self._falls, net)
+
+    @property
+    def untoggled(self):
+        """\
+        The sorted list of nets which have not both risen and fallen.
+        """
+        return [name for i, name in enumerate(self._nets) \
+            if not self._rises[i >> 3] & self._falls[i >> 3] & 1 << (i & 7)]
+
+    @property
+    def coverage(self):
+        """\
+        The fraction of net transitions (rises and falls) observed.
+        """
+        total = 2 * len(self._nets)
+        observed = _count(self._rises) + _count(self._falls)
+        return total and float(observed) / total or 1.0
+
+    def merge(self, other):
+        """\
+        Merge the coverage of another collector into this one. Nets and ports
+        tracked only by the other collector are added.
+
+        @param other: The other collector.
+        @type other: L{Coverage}
+        @return: This collector.
+        @rtype: L{Coverage}
+        """
+        if set(other._nets) - set(self._nets):
+            self._reindex(self._nets + other._nets)
+        for name in other._nets:
+            i = self._indices[tuple(name.split('.', 1))]
+            if other._test(other._rises, name):
+                self._rises[i >> 3] |= 1 << (i & 7)
+            if other._test(other._falls, name):
+                self._falls[i >> 3] |= 1 << (i & 7)
+        for ports, others in [(self.inputs, other.inputs),
+                              (self.outputs, other.outputs)]:
+            for portid in others.keys():
+                ports.setdefault(portid, set()).update(others[portid])
+        return self
+
+    def report(self):
+        """\
+        Summarize the collected coverage.
+
+        @return: The number of nets, rises, falls, and fully toggled nets, the
+                 toggle coverage, and the sorted observed values of each
+                 tracked input and output.
+        @rtype: C{dict}
+        """
+        return {'nets': len(self._nets),
+                'rises': _count(self._rises),
+                'falls': _count(self._falls),
+                'toggled': len(self._nets) - len(self.untoggled),
+                'coverage': self.coverage,
+                'inputs': dict((inputid, sorted(self.inputs[inputid])) \
+                    for inputid in self.inputs.keys()),
+                'outputs': dict((outputid, sorted(self.outputs[outputid])) \
+                    for outputid in self.outputs.keys())}
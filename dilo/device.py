@@ -14,10 +14,85 @@ Device module.
 @license: GPL-3
 """
 
+import threading
+from collections import OrderedDict, deque
+
+from .boolean import BooleanExpression, CompiledExpression
+from .spatial import SpatialIndex
+
+# maximum number of changes of each device output in a single update
+EVENTS = 10
+
+
+class _Deliveries(threading.local):
+    """\
+    Deferred deliveries to receivers, and the depth of nested circuit updates
+    in progress. Kept per thread, so that circuits may be simulated in
+    several threads at once.
+    """
+    def __init__(self):
+        self.queue = OrderedDict()
+        self.depth = 0
+
+
+_deliveries = _Deliveries()
+
+
+def _deliver(receiver, value):
+    """\
+    Queue the delivery of a value to a receiver. Deliveries are flushed when
+    the outermost circuit update in progress completes, or immediately if
+    there is none.
+
+    @param receiver: The receiver.
+    @type receiver: L{Device}
+    @param value: The value.
+    @type value: C{bool} or C{int}
+    """
+    _deliveries.queue[receiver] = value
+    if not _deliveries.depth:
+        _flush()
+
+
+def _flush():
+    """\
+    Deliver queued values in batches. Each batch updates its receivers, then
+    updates each circuit containing them once; deliveries queued by those
+    updates form the next batch.
+    """
+    _deliveries.depth += 1
+    try:
+        receivers, rounds = set(), 0
+        while _deliveries.queue:
+            batch = list(_deliveries.queue.items())
+            _deliveries.queue.clear()
+            circuits = OrderedDict()
+            for receiver, value in batch:
+                receivers.add(receiver)
+                receiver._inputs['a'] = value
+                receiver._update()
+                for circuit, deviceid in receiver._owners:
+                    circuit._touch(deviceid)
+                    circuits[circuit] = None
+            for circuit in circuits.keys():
+                circuit._update()
+            rounds += 1
+            if rounds > EVENTS * len(receivers):
+                raise RuntimeError('update loop depth exceeded')
+    except RuntimeError:
+        _deliveries.queue.clear()
+        raise
+    finally:
+        _deliveries.depth -= 1
+
+
 class Device(object):
     """\
     Device class.
     """
+    # size of the device drawing in pixels, from its position
+    size = (40, 40)
+
     def __init__(self, pos=(0, 0)):
         """\
         Constructor. Not to be instantiated directly.
@@ -25,12 +100,40 @@ class Device(object):
         @param pos: The position of this device.
         @type pos: C{tuple} of C{int}
         """
+        self._owners = []
         self.pos = pos
         self._inputs = {}
         self._outputs = {}
         if self.__class__ is Device:
             raise NotImplementedError('cannot instantiate an abstract device')
 
+    @property
+    def pos(self):
+        """\
+        The position of this device.
+        """
+        return self._pos
+
+    @pos.setter
+    def pos(self, value):
+        """\
+        Set the position of this device, updating the spatial index of each
+        circuit containing it.
+        """
+        self._pos = tuple(value)
+        for circuit, deviceid in self._owners:
+            circuit._index.insert(deviceid, self._bounds())
+            circuit._rebound()
+
+    def _bounds(self):
+        """\
+        Return the rectangle covered by the drawing of this device.
+
+        @return: The rectangle (x, y, width, height).
+        @rtype: C{tuple} of C{int}
+        """
+        return self._pos + tuple(self.size)
+
     @property
     def inputs(self):
         """\
@@ -56,7 +159,7 @@ class Device(object):
         @param inputid: The input ID.
         @type inputid: C{str}
         @param value: The value to set.
-        @type value: C{bool}
+        @type value: C{bool} or C{int}
         """
         if not inputid in self.inputs:
             raise KeyError('no input %s' % inputid)
@@ -75,6 +178,28 @@ class Device(object):
         except KeyError:
             raise KeyError('no output %s' % outputid)
 
+    def _get_input(self, inputid):
+        """\
+        Get the current value of an input.
+
+        @param inputid: The input ID.
+        @type inputid: C{str}
+        """
+        return self._inputs[inputid]
+
+    def _evaluate(self, values, algebra):
+        """\
+        Describe the logic of this device in a Boolean algebra.
+
+        @param values: The operands of the inputs, in input order.
+        @type values: C{list}
+        @param algebra: The algebra.
+        @type algebra: L{Algebra}
+        @return: The operands of the outputs, keyed by output ID.
+        @rtype: C{dict}
+        """
+        raise TypeError('unsupported device %s' % self.__class__.__name__)
+
     def apply_inputs(self, values):
         """\
         Apply a set of values to the inputs.
@@ -113,7 +238,16 @@ class Circuit(Device):
         super(Circuit, self).__init__()
         self._devices = {}
         self._connections = {}
+        self._sinks = {}
+        self._ports = {}
         self._cached_outputs = {}
+        self._dirty = deque()
+        self._pending = set()
+        self._updating = False
+        self._applying = False
+        self._index = SpatialIndex()
+        # optional coverage collector (see L{dilo.coverage.Coverage})
+        self.coverage = None
 
     def __getitem__(self, key):
         """\
@@ -148,6 +282,107 @@ class Circuit(Device):
             for deviceid in self.devices \
             for outputid in self._devices[deviceid].outputs]
         
+    def _fanout(self):
+        """\
+        Return the connected inputs driven by each device output.
+
+        @return: Lists of (device ID, input ID), keyed by (device ID, output
+                 ID).
+        @rtype: C{dict} of C{list} of C{tuple}
+        """
+        return dict((source, sorted(self._sinks[source])) \
+            for source in self._sinks.keys())
+
+    def _link(self, dstinput, srcoutput):
+        """\
+        Add a connection and its fanout index entry, replacing any previous
+        connection of the input.
+
+        @param dstinput: The (device ID, input ID) of the input.
+        @type dstinput: C{tuple} of C{str}
+        @param srcoutput: The (device ID, output ID) of the output.
+        @type srcoutput: C{tuple} of C{str}
+        """
+        if dstinput in self._connections:
+            self._unlink(dstinput)
+        self._connections[dstinput] = srcoutput
+        self._sinks.setdefault(srcoutput, set()).add(dstinput)
+
+    def _unlink(self, dstinput):
+        """\
+        Delete a connection and its fanout index entry.
+
+        @param dstinput: The (device ID, input ID) of the input.
+        @type dstinput: C{tuple} of C{str}
+        @return: The (device ID, output ID) of the output it was connected to.
+        @rtype: C{tuple} of C{str}
+        """
+        srcoutput = self._connections.pop(dstinput)
+        self._sinks[srcoutput].discard(dstinput)
+        if not len(self._sinks[srcoutput]):
+            del self._sinks[srcoutput]
+        return srcoutput
+
+    def _release(self, deviceid, inputid, value):
+        """\
+        Reset a disconnected input to the default value of the type of the
+        value it was driven with, and mark its device for re-evaluation. The
+        input is set through the device's own port resolution, so that inputs
+        of nested circuits are reset as well.
+
+        @param deviceid: The device ID.
+        @type deviceid: C{str}
+        @param inputid: The input ID.
+        @type inputid: C{str}
+        @param value: The value the input was driven with.
+        @type value: C{bool} or C{int}
+        """
+        self._devices[deviceid].set_input(inputid, type(value)())
+        self._touch(deviceid)
+
+    def _touch(self, deviceid):
+        """\
+        Mark a device for re-evaluation by the next update.
+
+        @param deviceid: The device ID.
+        @type deviceid: C{str}
+        """
+        if not deviceid in self._pending:
+            self._pending.add(deviceid)
+            self._dirty.append(deviceid)
+
+    def _is_input(self, inputid):
+        """\
+        Check whether an input ID is an input of this circuit, without
+        generating the list of inputs.
+
+        @param inputid: The input ID.
+        @type inputid: C{str}
+        @rtype: C{bool}
+        """
+        if len(self._inputs):
+            return inputid in self._inputs
+        deviceid = inputid.split('.')[0]
+        pinid = '.'.join(inputid.split('.')[1:])
+        return deviceid in self._devices \
+            and pinid in self._devices[deviceid].inputs \
+            and not (deviceid, pinid) in self._connections
+
+    def _is_output(self, outputid):
+        """\
+        Check whether an output ID is an output of this circuit, without
+        generating the list of outputs.
+
+        @param outputid: The output ID.
+        @type outputid: C{str}
+        @rtype: C{bool}
+        """
+        if len(self._outputs):
+            return outputid in self._outputs
+        deviceid = outputid.split('.')[0]
+        return deviceid in self._devices and '.'.join(outputid.split('.')[1:]) \
+            in self._devices[deviceid].outputs
+
     @property
     def inputs(self):
         """\
@@ -181,6 +416,57 @@ class Circuit(Device):
         """
         return list(self._devices.keys())
 
+    def _bounds(self):
+        """\
+        Return the rectangle covered by the drawings of the devices in this
+        circuit, which are drawn at their own positions.
+
+        @return: The rectangle (x, y, width, height).
+        @rtype: C{tuple} of C{int}
+        """
+        return self._index.bounds() or self.pos + (0, 0)
+
+    def _rebound(self):
+        """\
+        Update the spatial index of each circuit containing this one after
+        its contents have changed.
+        """
+        for circuit, deviceid in self._owners:
+            circuit._index.insert(deviceid, self._bounds())
+            circuit._rebound()
+
+    def devices_in_rect(self, x, y, width, height):
+        """\
+        Find the devices whose drawings intersect a rectangle.
+
+        @param x: The left edge of the rectangle.
+        @type x: C{int}
+        @param y: The top edge of the rectangle.
+        @type y: C{int}
+        @param width: The width of the rectangle.
+        @type width: C{int}
+        @param height: The height of the rectangle.
+        @type height: C{int}
+        @return: List of device IDs.
+        @rtype: C{list} of C{str}
+        """
+        devices = list(self._index.query((x, y, width, height)))
+        devices.sort()
+        return devices
+
+    def device_at(self, point):
+        """\
+        Find a device whose drawing contains a point.
+
+        @param point: The point.
+        @type point: C{tuple} of C{int}
+        @return: The device ID, or C{None} if there is no device at the point.
+        @rtype: C{str}
+        """
+        devices = list(self._index.at(point))
+        devices.sort()
+        return devices and devices[0] or None
+
     def add(self, deviceid, device):
         """\
         Add a device to the circuit.
@@ -195,6 +481,10 @@ class Circuit(Device):
         if deviceid in self._devices:
             raise ValueError('duplicate device ID')
         self._devices[deviceid] = device
+        device._owners.append((self, deviceid))
+        self._index.insert(deviceid, device._bounds())
+        self._rebound()
+        self._ports[deviceid] = device.outputs
         for outputid in device.outputs:
             self._cached_outputs[(deviceid, outputid)] = \
                 device.get_output(outputid)
@@ -202,23 +492,22 @@ class Circuit(Device):
     def remove(self, deviceid):
         """\
         Remove a device from the circuit and delete all of its connections,
-        cached outputs, and labels.
+        cached outputs, and labels. Inputs it drove are reset and their fanout
+        re-evaluated.
 
         @param deviceid: The ID of the device to remove.
         @type deviceid: C{str}
         """
-        # delete connections
-        connections = list(self._connections.keys())
-        for connection in connections:
-            if connection[0] == deviceid:
-                del self._connections[connection]
-            elif self._connections[connection][0] == deviceid:
-                del self._connections[connection]
-        # delete cached outputs
-        cached_outputs = list(self._cached_outputs.keys())
-        for cached_output in cached_outputs:
-            if cached_output[0] == deviceid:
-                del self._cached_outputs[cached_output]
+        # delete connections and cached outputs
+        for inputid in self._devices[deviceid].inputs:
+            if (deviceid, inputid) in self._connections:
+                self._unlink((deviceid, inputid))
+        sinks = []
+        for outputid in self._ports.pop(deviceid):
+            value = self._cached_outputs.pop((deviceid, outputid))
+            for dstinput in list(self._sinks.get((deviceid, outputid), ())):
+                self._unlink(dstinput)
+                sinks.append(dstinput + (value,))
         # delete labels
         for inputid in self._devices[deviceid].inputs:
             labels = list(self._inputs.keys())
@@ -232,7 +521,94 @@ class Circuit(Device):
                 if self._outputs[label] == '%s.%s' % (deviceid, outputid):
                     del self._outputs[label]
         # delete device
+        self._devices[deviceid]._owners.remove((self, deviceid))
+        self._index.remove(deviceid)
+        self._rebound()
+        self._pending.discard(deviceid)
         del self._devices[deviceid]
+        for dstid, inputid, value in sinks:
+            self._release(dstid, inputid, value)
+        self._update()
+
+    def replace(self, deviceid, device, inputmap=None, absorb=[]):
+        """\
+        Replace a device in the circuit with another device under the same ID.
+        Connections from and labels on outputs of the replaced device are kept
+        for those outputs which the new device also has. Each input of the new
+        device takes over the connection, labels, and value of the internal
+        input it is mapped to, which may belong to the replaced device or to
+        any of the absorbed devices; by default, inputs are mapped to the
+        inputs of the same ID on the replaced device. Absorbed devices are
+        removed from the circuit.
+
+        @param deviceid: The ID of the device to replace.
+        @type deviceid: C{str}
+        @param device: The replacement device.
+        @type device: L{Device}
+        @param inputmap: Internal inputs to take over, keyed by input ID.
+        @type inputmap: C{dict} of C{str}
+        @param absorb: IDs of further devices to remove.
+        @type absorb: C{list} of C{str}
+        """
+        if not isinstance(device, Device):
+            raise TypeError('not a device')
+        removed = set(absorb) | set([deviceid])
+        if inputmap is None:
+            inputmap = dict((inputid, '%s.%s' % (deviceid, inputid)) \
+                for inputid in device.inputs \
+                if inputid in self._devices[deviceid].inputs)
+        # collect state of mapped inputs
+        sources, values, memberships = {}, {}, {}
+        for inputid in inputmap.keys():
+            srcid = inputmap[inputid].split('.')[0]
+            srcinput = '.'.join(inputmap[inputid].split('.')[1:])
+            if (srcid, srcinput) in self._connections:
+                sources[inputid] = self._connections[(srcid, srcinput)]
+                if sources[inputid][0] in removed:
+                    raise ValueError('input %s is driven by a removed device' \
+                        % inputmap[inputid])
+            else:
+                values[inputid] = self._devices[srcid]._inputs[srcinput]
+            memberships[inputid] = [label for label in self._inputs.keys() \
+                if inputmap[inputid] in self._inputs[label]]
+        # collect state of kept outputs
+        sinks = [(connection, self._connections[connection][1]) \
+            for connection in self._connections.keys() \
+            if self._connections[connection][0] == deviceid \
+            and self._connections[connection][1] in device.outputs \
+            and not connection[0] in removed]
+        outlabels = [(label, self._outputs[label]) \
+            for label in self._outputs.keys() \
+            if self._outputs[label].split('.')[0] == deviceid \
+            and '.'.join(self._outputs[label].split('.')[1:]) \
+            in device.outputs]
+        labels = dict((label, set(self._inputs[label])) \
+            for label in self._inputs.keys())
+        # swap devices
+        for removeid in removed:
+            self.remove(removeid)
+        self.add(deviceid, device)
+        # restore inputs
+        for label in labels.keys():
+            labels[label] = set(dstinput for dstinput in labels[label] \
+                if not dstinput.split('.')[0] in removed)
+        for inputid in inputmap.keys():
+            for label in memberships[inputid]:
+                labels[label].add('%s.%s' % (deviceid, inputid))
+        self._inputs = dict((label, labels[label]) \
+            for label in labels.keys() if len(labels[label]))
+        for inputid in values.keys():
+            device.set_input(inputid, values[inputid])
+        for inputid in sources.keys():
+            self.connect(sources[inputid][0], sources[inputid][1], deviceid,
+                         inputid)
+        # restore outputs
+        for connection, outputid in sinks:
+            self.connect(deviceid, outputid, connection[0], connection[1])
+        for label, srcoutput in outlabels:
+            self._outputs[label] = srcoutput
+        self._touch(deviceid)
+        self._update()
 
     def connect(self, srcid, outputid, dstid, inputid):
         """\
@@ -252,20 +628,23 @@ class Circuit(Device):
                 raise KeyError('invalid output/input')
         except KeyError:
             raise KeyError('invalid device')
-        self._connections[(dstid, inputid)] = (srcid, outputid)
+        self._link((dstid, inputid), (srcid, outputid))
         for label in self._inputs.keys():
             self._inputs[label].discard('%s.%s' % (dstid, inputid))
             if not len(self._inputs[label]):
                 del self._inputs[label]
         self._devices[dstid].set_input(inputid,
             self._devices[srcid].get_output(outputid))
+        self._touch(dstid)
         self._update()
 
     def disconnect(self, deviceid, inputid):
         """\
-        Disconnect an input.
+        Disconnect an input, resetting it and re-evaluating its fanout.
         """
-        del self._connections[(deviceid, inputid)]
+        srcoutput = self._unlink((deviceid, inputid))
+        self._release(deviceid, inputid, self._cached_outputs[srcoutput])
+        self._update()
 
     def label_inputs(self, label, dstinputs):
         """\
@@ -276,8 +655,9 @@ class Circuit(Device):
         @param dstinputs: A set of inputs to assign to the alias.
         @type dstinputs: C{set} of C{str}
         """
+        internal_inputs = set(self._internal_inputs())
         for dstinput in dstinputs:
-            if dstinput not in self._internal_inputs():
+            if dstinput not in internal_inputs:
                 raise KeyError('invalid input %s' % dstinput)
         self._inputs[label] = set(dstinputs)
 
@@ -301,9 +681,9 @@ class Circuit(Device):
         @param inputid: The input ID.
         @type inputid: C{str}
         @param value: The value to set.
-        @type value: C{bool}
+        @type value: C{bool} or C{int}
         """
-        if not internal and not inputid in self.inputs:
+        if not internal and not self._is_input(inputid):
             raise KeyError('no input %s' % inputid)
         if not internal and len(self._inputs):
             for dstinput in self._inputs[inputid]:
@@ -312,7 +692,33 @@ class Circuit(Device):
             deviceid = inputid.split('.')[0]
             inputid = '.'.join(inputid.split('.')[1:])
             self._devices[deviceid].set_input(inputid, value)
+            self._touch(deviceid)
         self._update()
+        if not internal and not self._applying:
+            self._sample()
+
+    def apply_inputs(self, values):
+        """\
+        Apply a set of values to the inputs.
+
+        @param values: The values to apply, keyed by input ID.
+        @type values: C{dict} of C{bool}
+        """
+        self._applying = True
+        try:
+            super(Circuit, self).apply_inputs(values)
+        finally:
+            self._applying = False
+        self._sample()
+
+    def _sample(self):
+        """\
+        Record the values of the ports of this circuit in its coverage, if it
+        is collected and the circuit has settled (that is, it is not being
+        updated as part of an enclosing circuit).
+        """
+        if self.coverage is not None and not _deliveries.depth:
+            self.coverage.sample(self)
 
     def get_output(self, outputid, internal=False):
         """\
@@ -321,7 +727,7 @@ class Circuit(Device):
         @param outputid: The output ID.
         @type outputid: C{str}
         """
-        if not internal and not outputid in self.outputs:
+        if not internal and not self._is_output(outputid):
             raise KeyError('no output %s' % outputid)
         if not internal and len(self._outputs):
             return self.get_output(self._outputs[outputid], internal=True)
@@ -330,28 +736,193 @@ class Circuit(Device):
             outputid = '.'.join(outputid.split('.')[1:])
             return self._devices[deviceid].get_output(outputid)
 
+    def _get_input(self, inputid):
+        """\
+        Get the current value of an input.
+
+        @param inputid: The input ID.
+        @type inputid: C{str}
+        """
+        if len(self._inputs):
+            inputid = sorted(self._inputs[inputid])[0]
+        deviceid = inputid.split('.')[0]
+        return self._devices[deviceid]._get_input(
+            '.'.join(inputid.split('.')[1:]))
+
+    def _sources(self):
+        """\
+        Return the source of each device input: a device output it is
+        connected to C{('net', (deviceid, outputid))}, an input of this circuit
+        C{('input', inputid)}, or otherwise a constant at its current value
+        C{('constant', value)}.
+
+        @return: The sources in input order, keyed by device ID.
+        @rtype: C{dict} of C{list} of C{tuple}
+        """
+        pins = {}
+        if len(self._inputs):
+            for label in self._inputs.keys():
+                for dstinput in self._inputs[label]:
+                    pins[dstinput] = label
+        else:
+            for dstinput in self.inputs:
+                pins[dstinput] = dstinput
+        sources = {}
+        for deviceid in self._devices.keys():
+            device = self._devices[deviceid]
+            sources[deviceid] = []
+            for inputid in device.inputs:
+                dstinput = '%s.%s' % (deviceid, inputid)
+                if (deviceid, inputid) in self._connections:
+                    sources[deviceid].append(('net',
+                        self._connections[(deviceid, inputid)]))
+                elif dstinput in pins:
+                    sources[deviceid].append(('input', pins[dstinput]))
+                else:
+                    sources[deviceid].append(('constant',
+                        device._get_input(inputid)))
+        return sources
+
+    def _order(self, sources, roots=None):
+        """\
+        Sort devices in topological order.
+
+        @param sources: The sources of each device input (see L{_sources}).
+        @type sources: C{dict} of C{list} of C{tuple}
+        @param roots: If given, sort only the fan-in of these devices.
+        @type roots: C{list} of C{str}
+        @return: The device IDs in topological order.
+        @rtype: C{list} of C{str}
+        @raise ValueError: The circuit is not combinational.
+        """
+        if roots is None:
+            deviceids = set(sources.keys())
+        else:
+            deviceids, stack = set(), list(roots)
+            while stack:
+                current = stack.pop()
+                if not current in deviceids:
+                    deviceids.add(current)
+                    stack.extend([source[1][0] for source in sources[current] \
+                        if source[0] == 'net'])
+        successors = dict((deviceid, set()) for deviceid in deviceids)
+        pending = {}
+        for deviceid in deviceids:
+            predecessors = set([source[1][0] for source in sources[deviceid] \
+                if source[0] == 'net'])
+            pending[deviceid] = len(predecessors)
+            for predecessor in predecessors:
+                successors[predecessor].add(deviceid)
+        ready = sorted([deviceid for deviceid in deviceids \
+            if not pending[deviceid]], reverse=True)
+        order = []
+        while ready:
+            deviceid = ready.pop()
+            order.append(deviceid)
+            for successor in sorted(successors[deviceid], reverse=True):
+                pending[successor] -= 1
+                if not pending[successor]:
+                    ready.append(successor)
+        if len(order) != len(deviceids):
+            raise ValueError('circuit is not combinational')
+        return order
+
+    def _evaluate(self, values, algebra):
+        """\
+        Describe the logic of this combinational circuit in a Boolean algebra,
+        by describing its devices in topological order. The description of
+        each device output is built once and shared by its whole fanout.
+        Unlabeled device inputs of a circuit with input labels are treated as
+        constants at their current values.
+
+        @param values: The operands of the inputs, in input order.
+        @type values: C{list}
+        @param algebra: The algebra.
+        @type algebra: L{Algebra}
+        @return: The operands of the outputs, keyed by output ID.
+        @rtype: C{dict}
+        @raise ValueError: The circuit is not combinational.
+        """
+        operands = dict(zip(self.inputs, values))
+        srcoutputs = dict((outputid, self._outputs.get(outputid, outputid)) \
+            for outputid in self.outputs)
+        sources = self._sources()
+        roots = [srcoutput.split('.')[0] for srcoutput in srcoutputs.values()]
+        nets = {}
+        for deviceid in self._order(sources, roots):
+            args = []
+            for kind, source in sources[deviceid]:
+                if kind == 'net':
+                    args.append(nets[source[0]][source[1]])
+                elif kind == 'input':
+                    args.append(operands[source])
+                else:
+                    args.append(algebra.constant(source))
+            nets[deviceid] = self._devices[deviceid]._evaluate(args, algebra)
+        return dict((outputid, nets[srcoutputs[outputid].split('.')[0]]\
+            ['.'.join(srcoutputs[outputid].split('.')[1:])]) \
+            for outputid in srcoutputs.keys())
+
+    def expressions(self):
+        """\
+        Derive a Boolean expression for each output of this combinational
+        circuit, with its inputs as variables (see L{_evaluate}).
+
+        @return: The expressions, keyed by output ID.
+        @rtype: C{dict} of L{BooleanExpression}
+        """
+        builder = CompiledExpression()
+        nodes = self._evaluate([builder.variable(inputid) \
+            for inputid in self.inputs], builder)
+        return dict((outputid, BooleanExpression._from_builder(builder,
+            nodes[outputid])) for outputid in nodes.keys())
+
     def _update(self):
         """\
-        Update outputs based on inputs.
+        Update outputs based on inputs. Devices marked for re-evaluation are
+        processed from a worklist; each changed output updates the inputs it
+        drives and marks their devices in turn, so that only the affected
+        fanout cone is re-evaluated.
         """
-        count = 0
-        change = True
-        while change:
-            count += 1
-            change = False
-            for cached_output in self._cached_outputs.keys():
-                if self.get_output('%s.%s' % cached_output, internal=True) != \
-                self._cached_outputs[cached_output]:
-                    self._cached_outputs[cached_output] = \
-                        not self._cached_outputs[cached_output]
-                    for connection in self._connections.keys():
-                        if self._connections[connection] == cached_output:
-                            change = True
-                            self._devices[connection[0]].set_input(\
-                                connection[1],
-                                self._cached_outputs[cached_output])
-            if count > 10:
-                raise RuntimeError('update loop depth exceeded')
+        if self._updating:
+            return
+        self._updating = True
+        _deliveries.depth += 1
+        coverage = self.coverage
+        try:
+            budget = EVENTS * (len(self._cached_outputs) + 1)
+            while self._dirty:
+                deviceid = self._dirty.popleft()
+                self._pending.discard(deviceid)
+                if not deviceid in self._devices:
+                    continue
+                device = self._devices[deviceid]
+                for outputid in self._ports[deviceid]:
+                    cached_output = (deviceid, outputid)
+                    value = device.get_output(outputid)
+                    if value == self._cached_outputs[cached_output]:
+                        continue
+                    budget -= 1
+                    if budget < 0:
+                        raise RuntimeError('update loop depth exceeded')
+                    if coverage is not None:
+                        coverage.toggle(cached_output,
+                            self._cached_outputs[cached_output], value)
+                    self._cached_outputs[cached_output] = value
+                    for dstid, inputid in self._sinks.get(cached_output, ()):
+                        self._devices[dstid].set_input(inputid, value)
+                        self._touch(dstid)
+        except RuntimeError:
+            self._dirty.clear()
+            self._pending.clear()
+            if _deliveries.depth == 1:
+                _deliveries.queue.clear()
+            raise
+        finally:
+            self._updating = False
+            _deliveries.depth -= 1
+        if not _deliveries.depth and _deliveries.queue:
+            _flush()
 
     def draw(self, cr):
         """\
@@ -363,3 +934,4 @@ class Circuit(Device):
         for deviceid in self.devices:
             self._devices[deviceid].draw(cr)
         # TODO: draw connections
+
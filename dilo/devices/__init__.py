@@ -6,5 +6,16 @@
             #
             #
 
-__all__ = ['basic', 'gates']
+__all__ = ['basic', 'bus', 'gates', 'lut']
 __name__ = 'dilo.devices'
+
+
+def __getattr__(name):
+    """\
+    Import submodules lazily on first attribute access (Python 3.7+), so that
+    importing the package alone imports nothing else.
+    """
+    if name in __all__:
+        from importlib import import_module
+        return import_module('%s.%s' % (__name__, name))
+    raise AttributeError('module %s has no attribute %s' % (__name__, name))
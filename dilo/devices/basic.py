@@ -14,7 +14,7 @@ Basic devices.
 @license: GPL-3
 """
 
-from ..device import Device
+from ..device import Device, _deliver
 
 
 class Logic0(Device):
@@ -34,6 +34,12 @@ class Logic0(Device):
     def _update(self):
         pass
 
+    def _evaluate(self, values, algebra):
+        """\
+        Describe the logic of this device in a Boolean algebra.
+        """
+        return {'q': algebra.constant(False)}
+
 
 class Logic1(Device):
     """\
@@ -55,6 +61,12 @@ class Logic1(Device):
         """
         pass
 
+    def _evaluate(self, values, algebra):
+        """\
+        Describe the logic of this device in a Boolean algebra.
+        """
+        return {'q': algebra.constant(True)}
+
 
 class Buffer(Device):
     """\
@@ -77,6 +89,12 @@ class Buffer(Device):
         """
         self._outputs['q'] = self._inputs['a']
 
+    def _evaluate(self, values, algebra):
+        """\
+        Describe the logic of this device in a Boolean algebra.
+        """
+        return {'q': values[0]}
+
 
 class Inverter(Device):
     """\
@@ -99,6 +117,73 @@ class Inverter(Device):
         """
         self._outputs['q'] = not self._inputs['a']
 
+    def _evaluate(self, values, algebra):
+        """\
+        Describe the logic of this device in a Boolean algebra.
+        """
+        return {'q': algebra.complement(values[0])}
+
+
+class Channel(object):
+    """\
+    One-to-many channel from a sender to its receivers. Values sent are
+    queued and delivered in batches once the outermost circuit update in
+    progress completes, so that each circuit containing receivers is updated
+    once per batch.
+    """
+    def __init__(self, sender):
+        """\
+        Constructor.
+
+        @param sender: The sender.
+        @type sender: L{Sender}
+        """
+        self.sender = sender
+        self._receivers = []
+
+    @property
+    def receivers(self):
+        """\
+        The list of attached receivers.
+        """
+        return list(self._receivers)
+
+    def attach(self, receiver):
+        """\
+        Attach a receiver, detaching it from any previous sender, and deliver
+        the current value to it.
+
+        @param receiver: The receiver.
+        @type receiver: L{Receiver}
+        """
+        if not isinstance(receiver, Receiver):
+            raise TypeError('invalid receiver')
+        if receiver._sender:
+            receiver._sender._channel.detach(receiver)
+        self._receivers.append(receiver)
+        receiver._sender = self.sender
+        _deliver(receiver, self.sender._outputs['q'])
+
+    def detach(self, receiver):
+        """\
+        Detach a receiver.
+
+        @param receiver: The receiver.
+        @type receiver: L{Receiver}
+        """
+        self._receivers.remove(receiver)
+        receiver._sender = None
+
+    def send(self, value):
+        """\
+        Send a value to all attached receivers.
+
+        @param value: The value.
+        @type value: C{bool} or C{int}
+        """
+        for receiver in self._receivers:
+            _deliver(receiver, value)
+
 
 class Sender(Buffer):
     """\
@@ -114,45 +199,61 @@ class Sender(Buffer):
         @type pos: C{tuple} of C{int}
         """
         super(Sender, self).__init__(pos=pos)
-        self._receiver = None
+        self._channel = Channel(self)
+
+    @property
+    def channel(self):
+        """\
+        The channel to the associated receivers.
+        """
+        return self._channel
+
+    @property
+    def receivers(self):
+        """\
+        The list of associated receivers.
+        """
+        return self._channel.receivers
 
     @property
     def receiver(self):
         """\
-        The associated receiver.
+        The associated receiver (the first, if there are several).
         """
-        return self._receiver
+        receivers = self._channel.receivers
+        return receivers and receivers[0] or None
 
     @receiver.setter
     def receiver(self, value):
         """\
-        Set the associated receiver.
+        Set the associated receiver, replacing any others.
         """
         if not isinstance(value, Receiver):
             raise TypeError('invalid receiver')
-        if self._receiver:
-            self._receiver._sender = None
-        self._receiver = value
-        self._receiver._sender = self
+        del self.receiver
+        self._channel.attach(value)
 
     @receiver.deleter
     def receiver(self):
         """\
-        Unset the associated receiver.
+        Unset the associated receivers.
         """
-        if self._receiver:
-            self._receiver._sender = None
-            self._receiver = None
+        for receiver in self._channel.receivers:
+            self._channel.detach(receiver)
 
     def _update(self):
         """\
-        Update outputs based on inputs. Also update the associated receiver if
-        it has been set.
+        Update outputs based on inputs. Also send the output to the associated
+        receivers.
         """
         super(Sender, self)._update()
-        if self._receiver:
-            self._receiver._inputs['a'] = self._outputs['q']
-            self._receiver._update()
+        self._channel.send(self._outputs['q'])
+
+    def _evaluate(self, values, algebra):
+        """\
+        Senders drive their receivers outside any algebra.
+        """
+        raise TypeError('unsupported device %s' % self.__class__.__name__)
 
 
 class Receiver(Buffer):
@@ -177,3 +278,9 @@ class Receiver(Buffer):
         The associated sender.
         """
         return self._sender
+
+    def _evaluate(self, values, algebra):
+        """\
+        Receivers are driven by their sender outside any algebra.
+        """
+        raise TypeError('unsupported device %s' % self.__class__.__name__)
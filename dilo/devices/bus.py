@@ -0,0 +1,341 @@
+  #   #               #
+  #   #               #
+### # # ### ### ### ###
+# # # # # # # # # # # #
+### # # ### ###  ## ###
+            #
+            #
+
+"""\
+Multi-bit bus devices. Bus ports carry unsigned integer words masked to the
+device width; control ports (select, clock, carry) carry single bits.
+
+@author: Aaron Mavrinac
+@contact: mavrinac@gmail.com
+@license: GPL-3
+"""
+
+from ..device import Device
+
+
+class BusDevice(Device):
+    """\
+    Bus device class.
+    """
+    def __init__(self, pos=(0, 0), width=8):
+        """\
+        Constructor. Not to be instantiated directly.
+
+        @param pos: The position of this device.
+        @type pos: C{tuple} of C{int}
+        @param width: The bus width in bits.
+        @type width: C{int}
+        """
+        super(BusDevice, self).__init__(pos=pos)
+        if self.__class__ is BusDevice:
+            raise NotImplementedError('cannot instantiate an abstract device')
+        if width < 1:
+            raise ValueError('bus width must be at least 1')
+        self._width = width
+
+    @property
+    def width(self):
+        """\
+        The bus width in bits.
+        """
+        return self._width
+
+    @property
+    def mask(self):
+        """\
+        The bit mask for a word of this bus width.
+        """
+        return (1 << self._width) - 1
+
+
+class BusConstant(BusDevice):
+    """\
+    Bus constant class.
+    """
+    def __init__(self, value=0, pos=(0, 0), width=8):
+        """\
+        Constructor.
+
+        @param value: The constant value.
+        @type value: C{int}
+        @param pos: The position of this device.
+        @type pos: C{tuple} of C{int}
+        @param width: The bus width in bits.
+        @type width: C{int}
+        """
+        super(BusConstant, self).__init__(pos=pos, width=width)
+        self._outputs = {'q': value & self.mask}
+
+    def _update(self):
+        """\
+        Update outputs based on inputs.
+        """
+        pass
+
+
+class BusBuffer(BusDevice):
+    """\
+    Bus buffer class.
+    """
+    def __init__(self, pos=(0, 0), width=8):
+        """\
+        Constructor.
+
+        @param pos: The position of this device.
+        @type pos: C{tuple} of C{int}
+        @param width: The bus width in bits.
+        @type width: C{int}
+        """
+        super(BusBuffer, self).__init__(pos=pos, width=width)
+        self._inputs = {'a': 0}
+        self._outputs = {'q': 0}
+
+    def _update(self):
+        """\
+        Update outputs based on inputs.
+        """
+        self._outputs['q'] = self._inputs['a'] & self.mask
+
+
+class BusInverter(BusDevice):
+    """\
+    Bus inverter (bitwise NOT) class.
+    """
+    def __init__(self, pos=(0, 0), width=8):
+        """\
+        Constructor.
+
+        @param pos: The position of this device.
+        @type pos: C{tuple} of C{int}
+        @param width: The bus width in bits.
+        @type width: C{int}
+        """
+        super(BusInverter, self).__init__(pos=pos, width=width)
+        self._inputs = {'a': 0}
+        self._outputs = {'q': self.mask}
+
+    def _update(self):
+        """\
+        Update outputs based on inputs.
+        """
+        self._outputs['q'] = ~self._inputs['a'] & self.mask
+
+
+class BusGate(BusDevice):
+    """\
+    Two-input bitwise bus gate class.
+    """
+    def __init__(self, pos=(0, 0), width=8):
+        """\
+        Constructor. Not to be instantiated directly.
+
+        @param pos: The position of this device.
+        @type pos: C{tuple} of C{int}
+        @param width: The bus width in bits.
+        @type width: C{int}
+        """
+        super(BusGate, self).__init__(pos=pos, width=width)
+        if self.__class__ is BusGate:
+            raise NotImplementedError('cannot instantiate an abstract gate')
+        self._inputs = {'a': 0, 'b': 0}
+        self._outputs = {'q': 0}
+
+
+class BusANDGate(BusGate):
+    """\
+    Bitwise AND bus gate class.
+    """
+    def _update(self):
+        """\
+        Update outputs based on inputs.
+        """
+        self._outputs['q'] = self._inputs['a'] & self._inputs['b'] & self.mask
+
+
+class BusORGate(BusGate):
+    """\
+    Bitwise OR bus gate class.
+    """
+    def _update(self):
+        """\
+        Update outputs based on inputs.
+        """
+        self._outputs['q'] = (self._inputs['a'] | self._inputs['b']) & self.mask
+
+
+class BusXORGate(BusGate):
+    """\
+    Bitwise XOR bus gate class.
+    """
+    def _update(self):
+        """\
+        Update outputs based on inputs.
+        """
+        self._outputs['q'] = (self._inputs['a'] ^ self._inputs['b']) & self.mask
+
+
+class Adder(BusDevice):
+    """\
+    Word adder class with carry in and carry out.
+    """
+    def __init__(self, pos=(0, 0), width=8):
+        """\
+        Constructor.
+
+        @param pos: The position of this device.
+        @type pos: C{tuple} of C{int}
+        @param width: The bus width in bits.
+        @type width: C{int}
+        """
+        super(Adder, self).__init__(pos=pos, width=width)
+        self._inputs = {'a': 0, 'b': 0, 'ci': False}
+        self._outputs = {'s': 0, 'co': False}
+
+    def _update(self):
+        """\
+        Update outputs based on inputs.
+        """
+        total = (self._inputs['a'] & self.mask) \
+              + (self._inputs['b'] & self.mask) + int(bool(self._inputs['ci']))
+        self._outputs['s'] = total & self.mask
+        self._outputs['co'] = total > self.mask
+
+
+class Multiplexer(BusDevice):
+    """\
+    Two-way bus multiplexer class. Output C{q} follows C{a} when the select
+    input C{s} is false and C{b} when it is true.
+    """
+    def __init__(self, pos=(0, 0), width=8):
+        """\
+        Constructor.
+
+        @param pos: The position of this device.
+        @type pos: C{tuple} of C{int}
+        @param width: The bus width in bits.
+        @type width: C{int}
+        """
+        super(Multiplexer, self).__init__(pos=pos, width=width)
+        self._inputs = {'a': 0, 'b': 0, 's': False}
+        self._outputs = {'q': 0}
+
+    def _update(self):
+        """\
+        Update outputs based on inputs.
+        """
+        self._outputs['q'] = \
+            self._inputs[self._inputs['s'] and 'b' or 'a'] & self.mask
+
+
+class Comparator(BusDevice):
+    """\
+    Unsigned magnitude comparator class.
+    """
+    def __init__(self, pos=(0, 0), width=8):
+        """\
+        Constructor.
+
+        @param pos: The position of this device.
+        @type pos: C{tuple} of C{int}
+        @param width: The bus width in bits.
+        @type width: C{int}
+        """
+        super(Comparator, self).__init__(pos=pos, width=width)
+        self._inputs = {'a': 0, 'b': 0}
+        self._outputs = {'lt': False, 'eq': True, 'gt': False}
+
+    def _update(self):
+        """\
+        Update outputs based on inputs.
+        """
+        a = self._inputs['a'] & self.mask
+        b = self._inputs['b'] & self.mask
+        self._outputs['lt'] = a < b
+        self._outputs['eq'] = a == b
+        self._outputs['gt'] = a > b
+
+
+class Register(BusDevice):
+    """\
+    Rising-edge triggered register class.
+    """
+    def __init__(self, pos=(0, 0), width=8):
+        """\
+        Constructor.
+
+        @param pos: The position of this device.
+        @type pos: C{tuple} of C{int}
+        @param width: The bus width in bits.
+        @type width: C{int}
+        """
+        super(Register, self).__init__(pos=pos, width=width)
+        self._inputs = {'d': 0, 'clk': False}
+        self._outputs = {'q': 0}
+        self._clk = False
+
+    def _update(self):
+        """\
+        Update outputs based on inputs.
+        """
+        if self._inputs['clk'] and not self._clk:
+            self._outputs['q'] = self._inputs['d'] & self.mask
+        self._clk = bool(self._inputs['clk'])
+
+
+class Splitter(BusDevice):
+    """\
+    Bus splitter class. Output C{qN} carries bit N of the bus input C{a}.
+    """
+    def __init__(self, pos=(0, 0), width=8):
+        """\
+        Constructor.
+
+        @param pos: The position of this device.
+        @type pos: C{tuple} of C{int}
+        @param width: The bus width in bits.
+        @type width: C{int}
+        """
+        super(Splitter, self).__init__(pos=pos, width=width)
+        self._inputs = {'a': 0}
+        self._outputs = dict(('q%d' % i, False) for i in range(width))
+
+    def _update(self):
+        """\
+        Update outputs based on inputs.
+        """
+        word = self._inputs['a']
+        for i in range(self._width):
+            self._outputs['q%d' % i] = bool(word >> i & 1)
+
+
+class Joiner(BusDevice):
+    """\
+    Bus joiner class. Bit N of the bus output C{q} is taken from input C{dN}.
+    """
+    def __init__(self, pos=(0, 0), width=8):
+        """\
+        Constructor.
+
+        @param pos: The position of this device.
+        @type pos: C{tuple} of C{int}
+        @param width: The bus width in bits.
+        @type width: C{int}
+        """
+        super(Joiner, self).__init__(pos=pos, width=width)
+        self._inputs = dict(('d%d' % i, False) for i in range(width))
+        self._outputs = {'q': 0}
+
+    def _update(self):
+        """\
+        Update outputs based on inputs.
+        """
+        word = 0
+        for i in range(self._width):
+            if self._inputs['d%d' % i]:
+                word |= 1 << i
+        self._outputs['q'] = word
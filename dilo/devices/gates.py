@@ -14,140 +14,203 @@ Basic logic gates.
 @license: GPL-3
 """
 
-from functools import reduce
-
 from ..device import Device
 
 
-class ANDGate(Device):
+def input_ids(width):
     """\
-    AND gate class.
+    Generate input IDs for a device of the specified width, following the
+    sequence a, b, ..., z, aa, ab, ...
+
+    @param width: The number of inputs.
+    @type width: C{int}
+    @return: List of input IDs.
+    @rtype: C{list} of C{str}
+    """
+    ids = []
+    for i in range(1, width + 1):
+        inputid = ''
+        while i:
+            i, r = divmod(i - 1, 26)
+            inputid = chr(ord('a') + r) + inputid
+        ids.append(inputid)
+    return ids
+
+
+class Gate(Device):
+    """\
+    N-input gate class. The number of true inputs is maintained incrementally
+    by L{set_input}, so subclasses compute their outputs in constant time
+    regardless of width.
     """
-    def __init__(self, pos=(0, 0)):
+    def __init__(self, pos=(0, 0), width=2):
         """\
-        Constructor.
+        Constructor. Not to be instantiated directly.
 
         @param pos: The position of this device.
         @type pos: C{tuple} of C{int}
+        @param width: The number of inputs.
+        @type width: C{int}
         """
-        super(ANDGate, self).__init__(pos=pos)
-        self._inputs = {'a': False, 'b': False}
-        self._outputs = {'q': False}
+        super(Gate, self).__init__(pos=pos)
+        if self.__class__ is Gate:
+            raise NotImplementedError('cannot instantiate an abstract gate')
+        if width < 2:
+            raise ValueError('gate width must be at least 2')
+        self._inputs = dict((inputid, False) for inputid in input_ids(width))
+        self._count = 0
+        self._outputs = {}
+        self._update()
+
+    @property
+    def width(self):
+        """\
+        The number of inputs to this gate.
+        """
+        return len(self._inputs)
+
+    def set_input(self, inputid, value):
+        """\
+        Set an input to a specified value.
 
+        @param inputid: The input ID.
+        @type inputid: C{str}
+        @param value: The value to set.
+        @type value: C{bool}
+        """
+        try:
+            previous = self._inputs[inputid]
+        except KeyError:
+            raise KeyError('no input %s' % inputid)
+        value = bool(value)
+        if value != previous:
+            self._inputs[inputid] = value
+            self._count += value and 1 or -1
+        self._update()
+
+
+class ANDGate(Gate):
+    """\
+    AND gate class.
+    """
     def _update(self):
         """\
         Update outputs based on inputs.
         """
-        self._outputs['q'] = all(self._inputs.values())
+        self._outputs['q'] = self._count == len(self._inputs)
 
+    def _evaluate(self, values, algebra):
+        """\
+        Describe the logic of this device in a Boolean algebra.
+        """
+        return {'q': algebra.conjunction(values)}
 
-class ORGate(Device):
+
+class ORGate(Gate):
     """\
     OR gate class.
     """
-    def __init__(self, pos=(0, 0)):
+    def _update(self):
         """\
-        Constructor.
-
-        @param pos: The position of this device.
-        @type pos: C{tuple} of C{int}
+        Update outputs based on inputs.
         """
-        super(ORGate, self).__init__(pos=pos)
-        self._inputs = {'a': False, 'b': False}
-        self._outputs = {'q': False}
+        self._outputs['q'] = self._count > 0
 
-    def _update(self):
+    def _evaluate(self, values, algebra):
         """\
-        Update outputs based on inputs.
+        Describe the logic of this device in a Boolean algebra.
         """
-        self._outputs['q'] = any(self._inputs.values())
+        return {'q': algebra.disjunction(values)}
 
 
-class NANDGate(Device):
+class NANDGate(Gate):
     """\
     NAND gate class.
     """
-    def __init__(self, pos=(0, 0)):
+    def _update(self):
         """\
-        Constructor.
-
-        @param pos: The position of this device.
-        @type pos: C{tuple} of C{int}
+        Update outputs based on inputs.
         """
-        super(NANDGate, self).__init__(pos=pos)
-        self._inputs = {'a': False, 'b': False}
-        self._outputs = {'q': True}
+        self._outputs['q'] = self._count < len(self._inputs)
 
-    def _update(self):
+    def _evaluate(self, values, algebra):
         """\
-        Update outputs based on inputs.
+        Describe the logic of this device in a Boolean algebra.
         """
-        self._outputs['q'] = not all(self._inputs.values())
+        return {'q': algebra.complement(algebra.conjunction(values))}
 
 
-class NORGate(Device):
+class NORGate(Gate):
     """\
     NOR gate class.
     """
-    def __init__(self, pos=(0, 0)):
+    def _update(self):
         """\
-        Constructor.
-
-        @param pos: The position of this device.
-        @type pos: C{tuple} of C{int}
+        Update outputs based on inputs.
         """
-        super(NORGate, self).__init__(pos=pos)
-        self._inputs = {'a': False, 'b': False}
-        self._outputs = {'q': True}
+        self._outputs['q'] = self._count == 0
 
-    def _update(self):
+    def _evaluate(self, values, algebra):
         """\
-        Update outputs based on inputs.
+        Describe the logic of this device in a Boolean algebra.
         """
-        self._outputs['q'] = not any(self._inputs.values())
+        return {'q': algebra.complement(algebra.disjunction(values))}
 
 
-class XORGate(Device):
+class XORGate(Gate):
     """\
     XOR gate class.
     """
-    def __init__(self, pos=(0, 0)):
+    def _update(self):
         """\
-        Constructor.
-
-        @param pos: The position of this device.
-        @type pos: C{tuple} of C{int}
+        Update outputs based on inputs.
         """
-        super(XORGate, self).__init__(pos=pos)
-        self._inputs = {'a': False, 'b': False}
-        self._outputs = {'q': False}
+        self._outputs['q'] = self._count % 2 == 1
 
-    def _update(self):
+    def _evaluate(self, values, algebra):
         """\
-        Update outputs based on inputs.
+        Describe the logic of this device in a Boolean algebra.
         """
-        self._outputs['q'] = reduce(lambda a, b: any((a, b)) \
-                             and not all((a, b)), self._inputs.values())
+        return {'q': algebra.parity(values)}
 
 
-class XNORGate(Device):
+class XNORGate(Gate):
     """\
     XNOR gate class.
     """
-    def __init__(self, pos=(0, 0)):
+    def _update(self):
         """\
-        Constructor.
+        Update outputs based on inputs.
+        """
+        self._outputs['q'] = self._count % 2 == 0
 
-        @param pos: The position of this device.
-        @type pos: C{tuple} of C{int}
+    def _evaluate(self, values, algebra):
+        """\
+        Describe the logic of this device in a Boolean algebra.
         """
-        super(XNORGate, self).__init__(pos=pos)
-        self._inputs = {'a': False, 'b': False}
-        self._outputs = {'q': True}
+        return {'q': algebra.complement(algebra.parity(values))}
+
 
+class ParityGenerator(Gate):
+    """\
+    Parity generator class. Output C{e} is true when an even number of inputs
+    are true, and output C{o} when an odd number are.
+    """
     def _update(self):
         """\
         Update outputs based on inputs.
         """
-        self._outputs['q'] = not reduce(lambda a, b: any((a, b)) \
-                             and not all((a, b)), self._inputs.values())
+        self._outputs['o'] = self._count % 2 == 1
+        self._outputs['e'] = not self._outputs['o']
+
+    def _evaluate(self, values, algebra):
+        """\
+        Describe the logic of this device in a Boolean algebra.
+        """
+        odd = algebra.parity(values)
+        return {'o': odd, 'e': algebra.complement(odd)}
+
+
+# controlling input value and resulting output for AND-type and OR-type gates
+CONTROLLING = {ANDGate: (False, False), NANDGate: (False, True),
+               ORGate: (True, True), NORGate: (True, False)}
@@ -0,0 +1,295 @@
+  #   #               #
+  #   #               #
+### # # ### ### ### ###
+# # # # # # # # # # # #
+### # # ### ###  ## ###
+            #
+            #
+
+"""\
+Lookup table devices and technology mapping.
+
+@author: Aaron Mavrinac
+@contact: mavrinac@gmail.com
+@license: GPL-3
+"""
+
+from ..device import Device
+from ..truth import binary_combinations
+from .basic import Logic0, Logic1, Buffer, Inverter
+from .gates import Gate, input_ids
+
+
+class LUTDevice(Device):
+    """\
+    Lookup table device class. An arbitrary function of k inputs is stored as
+    a packed truth table, in which bit N holds the output for the Nth input
+    combination in L{binary_combinations} order (the first input being the
+    most significant). The table index is maintained incrementally as inputs
+    change, so evaluation is a single bit lookup.
+    """
+    def __init__(self, table, width, pos=(0, 0)):
+        """\
+        Constructor.
+
+        @param table: The packed truth table, or a sequence of output values.
+        @type table: C{int} or C{list} of C{bool}
+        @param width: The number of inputs.
+        @type width: C{int}
+        @param pos: The position of this device.
+        @type pos: C{tuple} of C{int}
+        """
+        super(LUTDevice, self).__init__(pos=pos)
+        if width < 1:
+            raise ValueError('LUT width must be at least 1')
+        if hasattr(table, '__iter__'):
+            table = list(table)
+            if len(table) != 1 << width:
+                raise ValueError('table length does not match width')
+            table = sum([1 << i for i in range(len(table)) if table[i]])
+        self._table = table & ((1 << (1 << width)) - 1)
+        inputids = input_ids(width)
+        self._weights = dict((inputids[i], 1 << (width - i - 1)) \
+            for i in range(width))
+        self._inputs = dict((inputid, False) for inputid in inputids)
+        self._index = 0
+        self._outputs = {}
+        self._update()
+
+    @classmethod
+    def from_expression(cls, expression, variables=None, pos=(0, 0)):
+        """\
+        Construct a lookup table device from a Boolean expression. The Nth
+        input of the device corresponds to the Nth variable.
+
+        @param expression: The Boolean expression.
+        @type expression: L{BooleanExpression}
+        @param variables: The ordered variables (defaults to all variables in
+                          the expression, sorted).
+        @type variables: C{list} of C{str}
+        @param pos: The position of this device.
+        @type pos: C{tuple} of C{int}
+        @return: The lookup table device.
+        @rtype: L{LUTDevice}
+        """
+        if variables is None:
+            variables = expression.variables
+        return cls([expression.evaluate(values) \
+            for values in binary_combinations(variables)], len(variables),
+            pos=pos)
+
+    @classmethod
+    def from_circuit(cls, circuit, outputid=None, pos=(0, 0)):
+        """\
+        Construct a lookup table device by exhaustively characterizing an
+        output of a combinational circuit. The Nth input of the device
+        corresponds to the Nth input of the circuit. This changes the input
+        values of the circuit.
+
+        @param circuit: The circuit.
+        @type circuit: L{Circuit}
+        @param outputid: The circuit output (may be omitted if the circuit
+                         has a single output).
+        @type outputid: C{str}
+        @param pos: The position of this device.
+        @type pos: C{tuple} of C{int}
+        @return: The lookup table device.
+        @rtype: L{LUTDevice}
+        """
+        if outputid is None:
+            if len(circuit.outputs) != 1:
+                raise ValueError('circuit has multiple outputs')
+            outputid = circuit.outputs[0]
+        table = []
+        for values in binary_combinations(circuit.inputs):
+            circuit.apply_inputs(values)
+            table.append(circuit.get_output(outputid))
+        return cls(table, len(circuit.inputs), pos=pos)
+
+    @property
+    def table(self):
+        """\
+        The packed truth table.
+        """
+        return self._table
+
+    @property
+    def width(self):
+        """\
+        The number of inputs to this device.
+        """
+        return len(self._inputs)
+
+    def set_input(self, inputid, value):
+        """\
+        Set an input to a specified value.
+
+        @param inputid: The input ID.
+        @type inputid: C{str}
+        @param value: The value to set.
+        @type value: C{bool}
+        """
+        try:
+            previous = self._inputs[inputid]
+        except KeyError:
+            raise KeyError('no input %s' % inputid)
+        value = bool(value)
+        if value != previous:
+            self._inputs[inputid] = value
+            self._index ^= self._weights[inputid]
+        self._update()
+
+    def _update(self):
+        """\
+        Update outputs based on inputs.
+        """
+        self._outputs['q'] = bool(self._table >> self._index & 1)
+
+    def _evaluate(self, values, algebra):
+        """\
+        Describe the logic of this device in a Boolean algebra, by Shannon
+        expansion on the inputs, most significant first.
+        """
+        table = [algebra.constant(self._table >> i & 1) \
+            for i in range(1 << len(values))]
+        for value in reversed(values):
+            table = [algebra.select(value, table[i], table[i + 1]) \
+                for i in range(0, len(table), 2)]
+        return {'q': table[0]}
+
+
+def _mappable(device):
+    """\
+    Return whether a device is a single-output combinational device which
+    may be absorbed into a lookup table.
+
+    @param device: The device.
+    @type device: L{Device}
+    @rtype: C{bool}
+    """
+    return (type(device) in (Logic0, Logic1, Buffer, Inverter) \
+        or isinstance(device, (Gate, LUTDevice))) and device.outputs == ['q']
+
+
+def lut_map(circuit, k=4):
+    """\
+    Map cones of small combinational devices in a circuit onto k-input lookup
+    tables. Starting from each device whose output is labeled or drives more
+    or other than a single mappable device, fan-in devices with a single
+    unlabeled fanout are greedily absorbed while the cone has at most k
+    distinct inputs. Each cone is characterized and replaced by a
+    L{LUTDevice} under the ID of its root device, so connections from and
+    labels on the root output are preserved, as are input labels. Outputs
+    should be labeled, since otherwise every device output is a circuit output
+    and nothing can be absorbed; unlabeled inputs of absorbed devices are
+    renamed.
+
+    @param circuit: The circuit to map (modified in place).
+    @type circuit: L{Circuit}
+    @param k: The maximum number of lookup table inputs.
+    @type k: C{int}
+    @return: The number of devices eliminated.
+    @rtype: C{int}
+    """
+    if not len(circuit._outputs):
+        return 0
+    fanout = circuit._fanout()
+    labeled = set(circuit._outputs.values())
+
+    def absorbable(deviceid):
+        return _mappable(circuit[deviceid]) \
+            and len(fanout.get((deviceid, 'q'), [])) == 1 \
+            and not '%s.q' % deviceid in labeled
+
+    def leaf(deviceid, inputid):
+        if (deviceid, inputid) in circuit._connections:
+            return circuit._connections[(deviceid, inputid)]
+        pin = '%s.%s' % (deviceid, inputid)
+        labels = [label for label in circuit._inputs.keys() \
+            if pin in circuit._inputs[label]]
+        if len(labels) == 1:
+            return labels[0]
+        return pin
+
+    def leaves(cone):
+        found = []
+        for deviceid in cone:
+            for inputid in circuit[deviceid].inputs:
+                key = leaf(deviceid, inputid)
+                if isinstance(key, tuple) and key[0] in cone:
+                    continue
+                if not key in found:
+                    found.append(key)
+        return found
+
+    eliminated = 0
+    roots = [deviceid for deviceid in circuit.devices \
+        if _mappable(circuit[deviceid]) and not absorbable(deviceid)]
+    roots.sort()
+    for root in roots:
+        # grow the cone
+        cone = [root]
+        grown = True
+        while grown:
+            grown = False
+            for deviceid in list(cone):
+                for inputid in circuit[deviceid].inputs:
+                    source = circuit._connections.get((deviceid, inputid))
+                    if not source or source[0] in cone \
+                    or not absorbable(source[0]):
+                        continue
+                    if len(leaves(cone + [source[0]])) <= k:
+                        cone.append(source[0])
+                        grown = True
+        if len(cone) < 2:
+            continue
+        # order the cone topologically, skipping it if it is cyclic
+        order, visiting = [], set()
+
+        def visit(deviceid):
+            visiting.add(deviceid)
+            for inputid in circuit[deviceid].inputs:
+                source = circuit._connections.get((deviceid, inputid))
+                if source and source[0] in cone and not source[0] in order:
+                    if source[0] in visiting or not visit(source[0]):
+                        return False
+            order.append(deviceid)
+            return True
+
+        if not visit(root):
+            continue
+        # characterize the cone
+        keys = leaves(cone)
+        pins, table = {}, 0
+        for deviceid in order:
+            for inputid in circuit[deviceid].inputs:
+                pins.setdefault(leaf(deviceid, inputid),
+                                '%s.%s' % (deviceid, inputid))
+        saved = dict((deviceid, dict(circuit[deviceid]._inputs)) \
+            for deviceid in order)
+        for index in range(1 << len(keys)):
+            values = dict((keys[i], bool(index >> (len(keys) - i - 1) & 1)) \
+                for i in range(len(keys)))
+            for deviceid in order:
+                for inputid in circuit[deviceid].inputs:
+                    key = leaf(deviceid, inputid)
+                    if isinstance(key, tuple) and key[0] in cone:
+                        value = circuit[key[0]].get_output(key[1])
+                    else:
+                        value = values[key]
+                    circuit[deviceid].set_input(inputid, value)
+            if circuit[root].get_output('q'):
+                table |= 1 << index
+        for deviceid in order:
+            for inputid in saved[deviceid].keys():
+                circuit[deviceid].set_input(inputid, saved[deviceid][inputid])
+        # replace the cone
+        if keys:
+            lut = LUTDevice(table, len(keys), pos=circuit[root].pos)
+        else:
+            lut = (table and Logic1 or Logic0)(pos=circuit[root].pos)
+        inputids = input_ids(len(keys))
+        circuit.replace(root, lut, inputmap=dict((inputids[i], pins[keys[i]]) \
+            for i in range(len(keys))), absorb=cone[1:])
+        eliminated += len(cone) - 1
+    return eliminated
@@ -0,0 +1,307 @@
+  #   #               #
+  #   #               #
+### # # ### ### ### ###
+# # # # # # # # # # # #
+### # # ### ###  ## ###
+            #
+            #
+
+"""\
+Stuck-at fault simulation module.
+
+A fault is a tuple of an internal device port (input or output, e.g.
+C{'two.a'}) and the value it is stuck at. Test vectors are graded by
+parallel-pattern single-fault propagation: each batch of vectors is packed one
+per bit into integer words, the fault-free circuit is simulated once per
+batch, and each remaining fault is injected and simulated through its fanout
+cone only. Detected faults are dropped from later batches.
+
+@author: Aaron Mavrinac
+@contact: mavrinac@gmail.com
+@license: GPL-3
+"""
+
+__all__ = ['faults', 'collapse_faults', 'FaultSimulator', 'FaultReport']
+
+from .boolean import Algebra
+from .devices.basic import Buffer, Inverter
+from .devices.gates import CONTROLLING
+
+
+class _Words(Algebra):
+    """\
+    Bit-parallel algebra, in which each operand is a word packing one pattern
+    per bit.
+    """
+    def __init__(self, mask):
+        """\
+        Constructor.
+
+        @param mask: The mask of valid pattern bits.
+        @type mask: C{int}
+        """
+        self.mask = mask
+
+    def constant(self, value):
+        return value and self.mask or 0
+
+    def complement(self, a):
+        return a ^ self.mask
+
+    def conjunction(self, args):
+        result = self.mask
+        for a in args:
+            result &= a
+        return result
+
+    def disjunction(self, args):
+        result = 0
+        for a in args:
+            result |= a
+        return result
+
+    def parity(self, args):
+        result = 0
+        for a in args:
+            result ^= a
+        return result
+
+    def select(self, s, a, b):
+        return a & ~s | b & s
+
+
+def faults(circuit):
+    """\
+    Enumerate the stuck-at-0 and stuck-at-1 faults on every device port in a
+    circuit.
+
+    @param circuit: The circuit.
+    @type circuit: L{Circuit}
+    @return: The faults.
+    @rtype: C{list} of C{tuple}
+    """
+    result = []
+    for deviceid in sorted(circuit.devices):
+        device = circuit[deviceid]
+        for portid in device.inputs + device.outputs:
+            for value in (False, True):
+                result.append(('%s.%s' % (deviceid, portid), value))
+    return result
+
+
+def collapse_faults(circuit):
+    """\
+    Partition the faults of a circuit into equivalence classes, using the
+    controlling values of gates, buffers and inverters, and fanout-free
+    connections to unlabeled outputs.
+
+    @param circuit: The circuit.
+    @type circuit: L{Circuit}
+    @return: The faults in each class, keyed by representative fault.
+    @rtype: C{dict} of C{list} of C{tuple}
+    """
+    parent = dict((fault, fault) for fault in faults(circuit))
+
+    def find(fault):
+        while parent[fault] != fault:
+            parent[fault] = parent[parent[fault]]
+            fault = parent[fault]
+        return fault
+
+    def union(a, b):
+        a, b = find(a), find(b)
+        if a != b:
+            parent[max(a, b)] = min(a, b)
+
+    for deviceid in circuit.devices:
+        device = circuit[deviceid]
+        output = '%s.q' % deviceid
+        if type(device) in (Buffer, Inverter):
+            for value in (False, True):
+                union(('%s.a' % deviceid, value),
+                      (output, value != (type(device) is Inverter)))
+        elif type(device) in CONTROLLING:
+            control, result = CONTROLLING[type(device)]
+            for inputid in device.inputs:
+                union(('%s.%s' % (deviceid, inputid), control),
+                      (output, result))
+    if len(circuit._outputs):
+        labeled = set(circuit._outputs.values())
+        fanout = circuit._fanout()
+        for source in fanout.keys():
+            if len(fanout[source]) == 1 and not '%s.%s' % source in labeled:
+                for value in (False, True):
+                    union(('%s.%s' % source, value),
+                          ('%s.%s' % fanout[source][0], value))
+    classes = {}
+    for fault in parent.keys():
+        classes.setdefault(find(fault), []).append(fault)
+    for representative in classes.keys():
+        classes[representative].sort()
+    return classes
+
+
+class FaultReport(object):
+    """\
+    Fault grading report class.
+    """
+    def __init__(self, detected, undetected):
+        """\
+        Constructor.
+
+        @param detected: The index of the first detecting vector, keyed by
+                         fault.
+        @type detected: C{dict} of C{int}
+        @param undetected: The undetected faults.
+        @type undetected: C{list} of C{tuple}
+        """
+        self.detected = detected
+        self.undetected = undetected
+
+    @property
+    def coverage(self):
+        """\
+        The fraction of faults detected.
+        """
+        total = len(self.detected) + len(self.undetected)
+        return total and float(len(self.detected)) / total or 1.0
+
+
+class FaultSimulator(object):
+    """\
+    Parallel-pattern stuck-at fault simulator class.
+    """
+    def __init__(self, circuit):
+        """\
+        Constructor. The circuit must be combinational and built from devices
+        which describe their logic in a Boolean algebra (constants, buffers,
+        inverters, gates, lookup tables, and such circuits); it is compiled
+        once, so later changes to it are not seen.
+
+        @param circuit: The circuit.
+        @type circuit: L{Circuit}
+        """
+        self.circuit = circuit
+        self._devices = dict((deviceid, circuit[deviceid]) \
+            for deviceid in circuit.devices)
+        # raises for devices without a description in a Boolean algebra
+        for device in self._devices.values():
+            device._evaluate([0] * len(device.inputs), _Words(1))
+        # input sources: a connected net, a circuit input, or a constant
+        self._sources = circuit._sources()
+        successors = dict((deviceid, set()) for deviceid in self._devices)
+        for deviceid in self._devices.keys():
+            for kind, source in self._sources[deviceid]:
+                if kind == 'net':
+                    successors[source[0]].add(deviceid)
+        self._order = circuit._order(self._sources)
+        self._position = dict((self._order[i], i) \
+            for i in range(len(self._order)))
+        self._successors = successors
+        self._cones = {}
+        self._observed = []
+        for outputid in circuit.outputs:
+            srcoutput = len(circuit._outputs) \
+                and circuit._outputs[outputid] or outputid
+            self._observed.append((srcoutput.split('.')[0],
+                                   '.'.join(srcoutput.split('.')[1:])))
+
+    def _cone(self, deviceid):
+        """\
+        Return the devices in the transitive fanout of a device (including
+        itself), in topological order.
+        """
+        if not deviceid in self._cones:
+            cone, stack = set(), [deviceid]
+            while stack:
+                current = stack.pop()
+                if not current in cone:
+                    cone.add(current)
+                    stack.extend(self._successors[current])
+            self._cones[deviceid] = sorted(cone, key=self._position.get)
+        return self._cones[deviceid]
+
+    def _simulate(self, inputs, mask, fault=None, good=None):
+        """\
+        Simulate the circuit bit-parallel, either fault-free or with a fault
+        injected, in which case only the fanout cone of the fault is
+        simulated and only the nets which differ are returned.
+        """
+        values, algebra = {}, _Words(mask)
+        if fault is None:
+            order = self._order
+        else:
+            pin, value = fault
+            faultid = pin.split('.')[0]
+            faultport = '.'.join(pin.split('.')[1:])
+            order = self._cone(faultid)
+        for deviceid in order:
+            sources = self._sources[deviceid]
+            if fault is not None and deviceid != faultid and not [source \
+                for source in sources if source[0] == 'net' \
+                and source[1] in values]:
+                continue
+            device = self._devices[deviceid]
+            words = []
+            for i in range(len(sources)):
+                kind, source = sources[i]
+                if kind == 'net' and source in values:
+                    words.append(values[source])
+                elif kind == 'net':
+                    words.append(good[source])
+                elif kind == 'input':
+                    words.append(inputs[source])
+                else:
+                    words.append(source and mask or 0)
+            if fault is not None and deviceid == faultid \
+            and faultport in device.inputs:
+                words[device.inputs.index(faultport)] = value and mask or 0
+            outputs = device._evaluate(words, algebra)
+            if fault is not None and deviceid == faultid \
+            and faultport in outputs:
+                outputs[faultport] = value and mask or 0
+            for outputid in outputs.keys():
+                if good is None or outputs[outputid] != good[(deviceid,
+                                                              outputid)]:
+                    values[(deviceid, outputid)] = outputs[outputid]
+        return values
+
+    def grade(self, vectors, faults=None, width=64):
+        """\
+        Grade a set of test vectors against a set of faults.
+
+        @param vectors: The test vectors, each a set of input values keyed by
+                        input ID (missing inputs are false).
+        @type vectors: C{list} of C{dict} of C{bool}
+        @param faults: The faults to grade (defaults to the representatives
+                       of the collapsed faults of the circuit).
+        @type faults: C{list} of C{tuple}
+        @param width: The number of vectors simulated in parallel.
+        @type width: C{int}
+        @return: The fault report.
+        @rtype: L{FaultReport}
+        """
+        if faults is None:
+            faults = sorted(collapse_faults(self.circuit).keys())
+        remaining = list(faults)
+        detected = {}
+        inputs = self.circuit.inputs
+        for start in range(0, len(vectors), width):
+            if not remaining:
+                break
+            batch = vectors[start:start + width]
+            mask = (1 << len(batch)) - 1
+            words = dict((inputid, sum([1 << i for i in range(len(batch)) \
+                if batch[i].get(inputid)])) for inputid in inputs)
+            good = self._simulate(words, mask)
+            for fault in remaining:
+                values = self._simulate(words, mask, fault=fault, good=good)
+                difference = 0
+                for source in self._observed:
+                    if source in values:
+                        difference |= values[source] ^ good[source]
+                if difference:
+                    detected[fault] = start \
+                        + (difference & -difference).bit_length() - 1
+            remaining = [fault for fault in remaining if not fault in detected]
+        return FaultReport(detected, remaining)
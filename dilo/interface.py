@@ -17,43 +17,107 @@ PyGTK interface module.
 import pygtk
 pygtk.require('2.0')
 import gtk
+import cairo
 
 from .device import Circuit
 
+GRID = 10
+SPRITES = 1024
+
 
 class Pad(gtk.DrawingArea):
     """\
-    Drawing area widget.
+    Drawing area widget. The background grid is pre-rendered to a surface
+    which is only re-rendered when the pad is resized, and devices are
+    rendered to surfaces cached by type and state, so that exposing a region
+    of the pad only composites cached surfaces within that region.
     """
-    __gsignals__ = {'expose-event': 'override'}
+    __gsignals__ = {'expose-event': 'override',
+                    'configure-event': 'override'}
 
     def __init__(self):
         super(Pad, self).__init__()
         self.circuit = Circuit()
+        self._background = None
+        self._sprites = {}
+
+    def do_configure_event(self, event):
+        # resized: invalidate the background
+        self._background = None
 
     def do_expose_event(self, event):
         cr = self.window.cairo_create()
         cr.rectangle(event.area.x, event.area.y, event.area.width, event.area.height)
         cr.clip()
-        self.draw(cr, *self.window.get_size())
+        self.draw(cr, *self.window.get_size(), area=(event.area.x,
+            event.area.y, event.area.width, event.area.height))
+
+    def damage(self, deviceid):
+        """\
+        Queue a redraw of the region covered by a device, e.g. after its state
+        has changed.
+
+        @param deviceid: The device ID.
+        @type deviceid: C{str}
+        """
+        device = self.circuit[deviceid]
+        self.queue_draw_area(device.pos[0], device.pos[1], *device.size)
 
-    def draw(self, cr, width, height):
+    def _render_background(self, width, height):
+        """\
+        Render the background and grid to a surface.
+        """
+        surface = cairo.ImageSurface(cairo.FORMAT_RGB24, width, height)
+        cr = cairo.Context(surface)
         # background
         cr.set_source_rgb(0, 0, 0)
-        cr.rectangle(0, 0, width, height)
-        cr.fill()
-        # grid
+        cr.paint()
+        # grid, stroked as a single path
         cr.set_source_rgb(0.0, 0.0, 0.1)
-        for x in range(width // 10 + 1):
-            cr.move_to(x * 10, 0)
+        for x in range(width // GRID + 1):
+            cr.move_to(x * GRID, 0)
             cr.rel_line_to(0, height)
-            cr.stroke()
-        for y in range(height // 10 + 1):
-            cr.move_to(0, y * 10)
+        for y in range(height // GRID + 1):
+            cr.move_to(0, y * GRID)
             cr.rel_line_to(width, 0)
-            cr.stroke()
+        cr.stroke()
+        return surface
+
+    def _sprite(self, device):
+        """\
+        Return a surface with a device rendered on it, from the cache if the
+        device type and state has been rendered before.
+        """
+        key = (device.__class__, device.size,
+               tuple(sorted(device._inputs.items())),
+               tuple(sorted(device._outputs.items())))
+        if not key in self._sprites:
+            if len(self._sprites) >= SPRITES:
+                self._sprites.clear()
+            surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, *device.size)
+            cr = cairo.Context(surface)
+            cr.translate(-device.pos[0], -device.pos[1])
+            device.draw(cr)
+            self._sprites[key] = surface
+        return self._sprites[key]
+
+    def draw(self, cr, width, height, area=None):
+        # background
+        if self._background is None \
+        or self._background.get_width() != width \
+        or self._background.get_height() != height:
+            self._background = self._render_background(width, height)
+        cr.set_source_surface(self._background, 0, 0)
+        cr.paint()
         # circuit
-        self.circuit.draw(cr)
+        for deviceid in self.circuit.devices_in_rect(\
+            *(area or (0, 0, width, height))):
+            device = self.circuit[deviceid]
+            if isinstance(device, Circuit):
+                device.draw(cr)
+                continue
+            cr.set_source_surface(self._sprite(device), *device.pos)
+            cr.paint()
 
 
 class Interface(gtk.Window):
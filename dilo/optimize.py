@@ -0,0 +1,318 @@
+  #   #               #
+  #   #               #
+### # # ### ### ### ###
+# # # # # # # # # # # #
+### # # ### ###  ## ###
+            #
+            #
+
+"""\
+Circuit optimization module.
+
+Passes operate on a circuit in place and return the number of devices they
+eliminated or simplified. Passes which remove devices require the circuit to
+have labeled outputs, since otherwise every device output is a circuit output.
+Input labels are never dropped.
+
+@author: Aaron Mavrinac
+@contact: mavrinac@gmail.com
+@license: GPL-3
+"""
+
+__all__ = ['propagate_constants', 'collapse_buffers', 'remove_dead_logic',
+           'structural_hash', 'optimize']
+
+from .devices.basic import Logic0, Logic1, Buffer, Inverter
+from .devices.gates import Gate, ANDGate, ORGate, NANDGate, NORGate, \
+    XORGate, XNORGate, CONTROLLING, input_ids
+from .devices.lut import LUTDevice
+
+# gate classes with a single (non-inverted, inverted) input
+REDUCED = {ANDGate: Buffer, ORGate: Buffer, NANDGate: Inverter,
+           NORGate: Inverter, XORGate: Buffer, XNORGate: Inverter}
+
+
+def _constant(device, value):
+    """\
+    Return a constant device with the position of another device.
+    """
+    return (value and Logic1 or Logic0)(pos=device.pos)
+
+
+def _orphans(circuit, deviceid, inputids):
+    """\
+    Return whether dropping some inputs of a device would leave an input
+    label without any inputs.
+    """
+    dropped = set('%s.%s' % (deviceid, inputid) for inputid in inputids)
+    for label in circuit._inputs.keys():
+        if circuit._inputs[label] <= dropped:
+            return True
+    return False
+
+
+def _move_output(circuit, fanout, srcid, outputid, dstid, dstoutputid):
+    """\
+    Move the connections from and labels on a device output to another
+    device output.
+    """
+    for connection in fanout.pop((srcid, outputid), []):
+        circuit.connect(dstid, dstoutputid, connection[0], connection[1])
+        fanout.setdefault((dstid, dstoutputid), []).append(connection)
+    for label in circuit._outputs.keys():
+        if circuit._outputs[label] == '%s.%s' % (srcid, outputid):
+            circuit._outputs[label] = '%s.%s' % (dstid, dstoutputid)
+
+
+def _fold(circuit, deviceid, constants):
+    """\
+    Fold constant inputs into a single device. Return the replacement device
+    and input map, or C{None} if the device cannot be simplified.
+    """
+    device = circuit[deviceid]
+    kept = [inputid for inputid in device.inputs if not inputid in constants]
+    inputmap = dict((input_ids(len(kept))[i], '%s.%s' % (deviceid, kept[i])) \
+        for i in range(len(kept)))
+    if type(device) is Buffer:
+        return _constant(device, constants['a']), {}
+    elif type(device) is Inverter:
+        return _constant(device, not constants['a']), {}
+    elif type(device) in CONTROLLING:
+        control, result = CONTROLLING[type(device)]
+        if control in constants.values():
+            if _orphans(circuit, deviceid, kept):
+                return None
+            return _constant(device, result), {}
+        cls = type(device)
+        if not kept:
+            return _constant(device, not result), {}
+    elif type(device) in (XORGate, XNORGate):
+        cls = type(device)
+        if sum([constants[inputid] for inputid in constants.keys()]) % 2:
+            cls = cls is XORGate and XNORGate or XORGate
+        if not kept:
+            return _constant(device, cls is XNORGate), {}
+    elif isinstance(device, LUTDevice):
+        fixed = sum([device._weights[inputid] for inputid in constants.keys() \
+            if constants[inputid]])
+        table = 0
+        for index in range(1 << len(kept)):
+            old = fixed
+            for i in range(len(kept)):
+                if index >> (len(kept) - i - 1) & 1:
+                    old |= device._weights[kept[i]]
+            if device.table >> old & 1:
+                table |= 1 << index
+        if not kept:
+            return _constant(device, table), {}
+        return LUTDevice(table, len(kept), pos=device.pos), inputmap
+    else:
+        return None
+    if len(kept) == 1:
+        return REDUCED[cls](pos=device.pos), inputmap
+    return cls(pos=device.pos, width=len(kept)), inputmap
+
+
+def propagate_constants(circuit):
+    """\
+    Fold constant (L{Logic0} and L{Logic1}) inputs through buffers, inverters,
+    gates, and lookup tables, replacing each simplified device with a narrower
+    or constant device under the same ID.
+
+    @param circuit: The circuit to optimize (modified in place).
+    @type circuit: L{Circuit}
+    @return: The number of devices simplified.
+    @rtype: C{int}
+    """
+    simplified = 0
+    change = True
+    while change:
+        change = False
+        for deviceid in circuit.devices:
+            device = circuit[deviceid]
+            if type(device) in (Logic0, Logic1) or device.outputs != ['q']:
+                continue
+            constants = {}
+            for inputid in device.inputs:
+                source = circuit._connections.get((deviceid, inputid))
+                if source and type(circuit[source[0]]) in (Logic0, Logic1):
+                    constants[inputid] = type(circuit[source[0]]) is Logic1
+            if not constants:
+                continue
+            folded = _fold(circuit, deviceid, constants)
+            if folded:
+                circuit.replace(deviceid, folded[0], inputmap=folded[1])
+                simplified += 1
+                change = True
+    return simplified
+
+
+def collapse_buffers(circuit):
+    """\
+    Bypass buffers and pairs of inverters, moving their connections and output
+    labels to the net driving them.
+
+    @param circuit: The circuit to optimize (modified in place).
+    @type circuit: L{Circuit}
+    @return: The number of devices removed.
+    @rtype: C{int}
+    """
+    if not len(circuit._outputs):
+        return 0
+    removed = 0
+    fanout = circuit._fanout()
+    for deviceid in circuit.devices:
+        device = circuit[deviceid]
+        source = driver = circuit._connections.get((deviceid, 'a'))
+        if not source:
+            continue
+        if type(device) is Inverter and type(circuit[source[0]]) is Inverter:
+            source = circuit._connections.get((source[0], 'a'))
+            if not source:
+                continue
+        elif type(device) is not Buffer:
+            continue
+        if source[0] == deviceid:
+            continue
+        _move_output(circuit, fanout, deviceid, 'q', source[0], source[1])
+        fanout[driver].remove((deviceid, 'a'))
+        circuit.remove(deviceid)
+        removed += 1
+    return removed
+
+
+def remove_dead_logic(circuit):
+    """\
+    Remove devices which are not in the fan-in cone of any labeled output or
+    of any device without outputs (such as a L{Sender}). A device is kept if
+    its removal would leave an input label without any inputs.
+
+    @param circuit: The circuit to optimize (modified in place).
+    @type circuit: L{Circuit}
+    @return: The number of devices removed.
+    @rtype: C{int}
+    """
+    if not len(circuit._outputs):
+        return 0
+    live = set()
+    pending = [circuit._outputs[label].split('.')[0] \
+        for label in circuit._outputs.keys()]
+    pending.extend([deviceid for deviceid in circuit.devices \
+        if not circuit[deviceid].outputs])
+    while pending:
+        deviceid = pending.pop()
+        if deviceid in live:
+            continue
+        live.add(deviceid)
+        for inputid in circuit[deviceid]._inputs.keys():
+            source = circuit._connections.get((deviceid, inputid))
+            if source:
+                pending.append(source[0])
+    dead = set(circuit.devices) - live
+    for label in circuit._inputs.keys():
+        owners = [dstinput.split('.')[0] for dstinput in circuit._inputs[label]]
+        if not set(owners) - dead:
+            owners.sort()
+            dead.discard(owners[0])
+    for deviceid in dead:
+        circuit.remove(deviceid)
+    return len(dead)
+
+
+def structural_hash(circuit):
+    """\
+    Merge structurally identical combinational devices, i.e. devices of the
+    same type and function driven by the same nets or input labels, visiting
+    devices in topological order so that merges cascade.
+
+    @param circuit: The circuit to optimize (modified in place).
+    @type circuit: L{Circuit}
+    @return: The number of devices removed.
+    @rtype: C{int}
+    """
+    if not len(circuit._outputs):
+        return 0
+    fanout = circuit._fanout()
+    hashable = lambda device: type(device) in (Logic0, Logic1, Buffer, \
+        Inverter) or isinstance(device, (Gate, LUTDevice))
+    # order hashable devices topologically
+    pending = dict((deviceid, len([inputid for inputid in \
+        circuit[deviceid].inputs if (deviceid, inputid) in \
+        circuit._connections and hashable(circuit[circuit._connections[\
+        (deviceid, inputid)][0]])])) for deviceid in circuit.devices \
+        if hashable(circuit[deviceid]))
+    ready = [deviceid for deviceid in pending.keys() if not pending[deviceid]]
+    ready.sort()
+    removed = 0
+    table = {}
+    while ready:
+        deviceid = ready.pop(0)
+        device = circuit[deviceid]
+        successors = [connection[0] for outputid in device.outputs \
+            for connection in fanout.get((deviceid, outputid), [])]
+        sources = []
+        for inputid in device.inputs:
+            if (deviceid, inputid) in circuit._connections:
+                sources.append(circuit._connections[(deviceid, inputid)])
+                continue
+            dstinput = '%s.%s' % (deviceid, inputid)
+            labels = [label for label in circuit._inputs.keys() \
+                if dstinput in circuit._inputs[label]]
+            if len(labels) != 1:
+                sources = None
+                break
+            sources.append(labels[0])
+        if sources is not None:
+            if not isinstance(device, LUTDevice):
+                sources.sort(key=repr)
+            key = (type(device), getattr(device, 'table', None),
+                   tuple(sources))
+            if key in table:
+                for outputid in device.outputs:
+                    _move_output(circuit, fanout, deviceid, outputid,
+                                 table[key], outputid)
+                for inputid in device.inputs:
+                    source = circuit._connections.get((deviceid, inputid))
+                    if source:
+                        fanout[source].remove((deviceid, inputid))
+                circuit.remove(deviceid)
+                removed += 1
+            else:
+                table[key] = deviceid
+        for successor in successors:
+            if successor in pending:
+                pending[successor] -= 1
+                if not pending[successor]:
+                    ready.append(successor)
+    return removed
+
+
+def optimize(circuit, passes=[propagate_constants, collapse_buffers,
+                              structural_hash, remove_dead_logic]):
+    """\
+    Run optimization passes on a circuit repeatedly until none of them makes
+    further progress.
+
+    @param circuit: The circuit to optimize (modified in place).
+    @type circuit: L{Circuit}
+    @param passes: The passes to run, in order.
+    @type passes: C{list} of C{function}
+    @return: The device and connection counts before and after optimization,
+             and the total result of each pass, keyed by pass name.
+    @rtype: C{dict}
+    """
+    report = {'devices': [len(circuit.devices)],
+              'connections': [len(circuit._connections)]}
+    change = True
+    while change:
+        change = False
+        for optimization in passes:
+            result = optimization(circuit)
+            report[optimization.__name__] = \
+                report.get(optimization.__name__, 0) + result
+            change = change or bool(result)
+    report['devices'].append(len(circuit.devices))
+    report['connections'].append(len(circuit._connections))
+    report['devices'] = tuple(report['devices'])
+    report['connections'] = tuple(report['connections'])
+    return report
@@ -0,0 +1,552 @@
+  #   #               #
+  #   #               #
+### # # ### ### ### ###
+# # # # # # # # # # # #
+### # # ### ###  ## ###
+            #
+            #
+
+
+"""\
+Partitioned multi-process simulation module.
+
+@author: Aaron Mavrinac
+@contact: mavrinac@gmail.com
+@license: GPL-3
+"""
+
+__all__ = ['ParallelCircuit', 'partition']
+
+import multiprocessing
+import threading
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    shared_memory = None
+try:
+    from queue import Empty
+except ImportError:
+    from Queue import Empty
+
+from .coverage import Coverage
+from .devices.basic import Sender, Receiver
+
+# control words
+RUN, STOP, COLLECT = 0, 1, 2
+# worker status words
+UNCHANGED, CHANGED, FAILED = 0, 1, 2
+# maximum number of exchange rounds per step
+ROUNDS = 1000
+# default number of seconds to wait for the workers at a barrier
+TIMEOUT = 60.0
+
+
+def _links(circuit):
+    """\
+    Return the sender-receiver pairs of a circuit with both devices in it.
+
+    @param circuit: The circuit.
+    @type circuit: L{Circuit}
+    @return: Pairs of (sender ID, receiver ID).
+    @rtype: C{list} of C{tuple}
+    """
+    ids = dict([(id(circuit[deviceid]), deviceid) \
+        for deviceid in circuit.devices])
+    links = []
+    for deviceid in circuit.devices:
+        device = circuit[deviceid]
+        if isinstance(device, Sender):
+            for receiver in device.receivers:
+                if id(receiver) in ids:
+                    links.append((deviceid, ids[id(receiver)]))
+    return links
+
+
+def _levels(circuit):
+    """\
+    Return the level of each device, as its breadth-first distance from the
+    devices with no connected inputs. Devices reachable only through cycles
+    are assigned level zero.
+
+    @param circuit: The circuit.
+    @type circuit: L{Circuit}
+    @return: The levels, keyed by device ID.
+    @rtype: C{dict} of C{int}
+    """
+    fanout = {}
+    for dst, src in circuit._connections.items():
+        fanout.setdefault(src[0], set()).add(dst[0])
+    sinks = set([dst[0] for dst in circuit._connections.keys()])
+    frontier = [deviceid for deviceid in circuit.devices \
+        if not deviceid in sinks]
+    levels = dict([(deviceid, 0) for deviceid in frontier])
+    while frontier:
+        following = []
+        for deviceid in frontier:
+            for dstid in fanout.get(deviceid, ()):
+                if not dstid in levels:
+                    levels[dstid] = levels[deviceid] + 1
+                    following.append(dstid)
+        frontier = following
+    for deviceid in circuit.devices:
+        levels.setdefault(deviceid, 0)
+    return levels
+
+
+def partition(circuit, parts):
+    """\
+    Partition the devices of a circuit into regions. Regions are first formed
+    from the connected components of the netlist, which are separated at
+    sender-receiver pairs and so cut no nets. If there are fewer components
+    than regions, the largest components are split in two by level, cutting
+    mostly forward nets. Components are then packed into the regions, largest
+    first into the smallest region.
+
+    @param circuit: The circuit.
+    @type circuit: L{Circuit}
+    @param parts: The number of regions.
+    @type parts: C{int}
+    @return: The device IDs of each non-empty region.
+    @rtype: C{list} of C{list} of C{str}
+    """
+    if parts < 1:
+        raise ValueError('at least one region is required')
+    neighbors = dict([(deviceid, set()) for deviceid in circuit.devices])
+    for dst, src in circuit._connections.items():
+        neighbors[dst[0]].add(src[0])
+        neighbors[src[0]].add(dst[0])
+    components, visited = [], set()
+    for deviceid in sorted(circuit.devices):
+        if deviceid in visited:
+            continue
+        component, stack = [], [deviceid]
+        visited.add(deviceid)
+        while stack:
+            current = stack.pop()
+            component.append(current)
+            for neighbor in neighbors[current]:
+                if not neighbor in visited:
+                    visited.add(neighbor)
+                    stack.append(neighbor)
+        components.append(component)
+    levels = _levels(circuit)
+    while len(components) < parts:
+        components.sort(key=len)
+        if len(components[-1]) < 2:
+            break
+        largest = sorted(components.pop(), key=lambda deviceid: \
+            (levels[deviceid], deviceid))
+        components.append(largest[:len(largest) // 2])
+        components.append(largest[len(largest) // 2:])
+    regions = [[] for i in range(parts)]
+    for component in sorted(components, key=len, reverse=True):
+        min(regions, key=len).extend(component)
+    return [sorted(region) for region in regions if region]
+
+
+def _describe(error):
+    """\
+    Describe an exception raised in a worker process.
+
+    @param error: The exception.
+    @type error: C{Exception}
+    @rtype: C{str}
+    """
+    return '%s: %s' % (error.__class__.__name__, error)
+
+
+def _worker(circuit, region, reads, writes, index, name, barrier, queue,
+            errors, timeout):
+    """\
+    Simulate a region of a circuit in a worker process. Errors are described
+    on the error queue; a failure to set up breaks the barrier, so that the
+    parent process does not wait for this worker.
+
+    @param circuit: The whole circuit.
+    @type circuit: L{Circuit}
+    @param region: The device IDs of the region.
+    @type region: C{list} of C{str}
+    @param reads: The (slot, kind, device ID, input ID) of each net read,
+                  with input ID C{None} for a receiver.
+    @type reads: C{list} of C{tuple}
+    @param writes: The (slot, device ID, output ID, boundary) of each net
+                   written.
+    @type writes: C{list} of C{tuple}
+    @param index: The index of this worker.
+    @type index: C{int}
+    @param name: The name of the shared memory block.
+    @type name: C{str}
+    @param barrier: The round barrier.
+    @type barrier: C{multiprocessing.Barrier}
+    @param queue: The queue to return coverage on, if it is collected.
+    @type queue: C{multiprocessing.Queue}
+    @param errors: The queue to return error descriptions on.
+    @type errors: C{multiprocessing.Queue}
+    @param timeout: The number of seconds to wait within a round.
+    @type timeout: C{float}
+    """
+    memory, words = None, None
+    try:
+        from .device import Circuit
+        local = Circuit()
+        devices = set([id(circuit[deviceid]) for deviceid in region])
+        for deviceid in region:
+            device = circuit[deviceid]
+            # values cross regions only through the shared memory, so the
+            # device must update nothing outside this region
+            device._owners = []
+            if isinstance(device, Sender):
+                for receiver in device.receivers:
+                    if not id(receiver) in devices:
+                        device.channel.detach(receiver)
+            elif isinstance(device, Receiver) and device.sender is not None \
+            and not id(device.sender) in devices:
+                device.sender.channel.detach(device)
+            local.add(deviceid, device)
+        for dst, src in circuit._connections.items():
+            if dst[0] in local._devices and src[0] in local._devices:
+                local._link(dst, src)
+        if queue is not None:
+            local.coverage = Coverage.from_circuit(local)
+        memory = shared_memory.SharedMemory(name=name)
+        words = memory.buf.cast('Q')
+        while True:
+            barrier.wait()
+            if words[0] == STOP:
+                break
+            elif words[0] == COLLECT:
+                queue.put(local.coverage)
+                continue
+            values = [(kind(words[slot]), deviceid, inputid) \
+                for slot, kind, deviceid, inputid in reads]
+            barrier.wait(timeout)
+            try:
+                for value, deviceid, inputid in values:
+                    device = local[deviceid]
+                    if inputid is None:
+                        device._inputs['a'] = value
+                        device._update()
+                    else:
+                        device.set_input(inputid, value)
+                    local._touch(deviceid)
+                local._update()
+                status = UNCHANGED
+                for slot, deviceid, outputid, boundary in writes:
+                    value = int(local[deviceid]._outputs[outputid])
+                    if boundary and words[slot] != value:
+                        status = CHANGED
+                    words[slot] = value
+            except Exception as error:
+                errors.put(_describe(error))
+                status = FAILED
+            words[1 + index] = status
+            barrier.wait(timeout)
+    except threading.BrokenBarrierError:
+        # the parent process or another worker has given up
+        pass
+    except Exception as error:
+        errors.put(_describe(error))
+        barrier.abort()
+    finally:
+        if words is not None:
+            words.release()
+        if memory is not None:
+            memory.close()
+
+
+class ParallelCircuit(object):
+    """\
+    Partitioned multi-process circuit simulator. Each region of the circuit
+    is simulated in its own worker process. Primary input, primary output, and
+    boundary net values are exchanged through a shared memory buffer of one
+    unsigned 64-bit word per net, in rounds separated by a barrier, until no
+    boundary net changes.
+    """
+    def __init__(self, circuit, processes=None, coverage=False,
+                 timeout=TIMEOUT):
+        """\
+        Constructor. The circuit is copied into the worker processes, and
+        should not be modified while this simulator is open. If a worker
+        fails or stops responding, the simulator is closed and a
+        C{RuntimeError} describing the failure is raised.
+
+        @param circuit: The circuit.
+        @type circuit: L{Circuit}
+        @param processes: The number of worker processes (defaults to the
+                          number of CPUs).
+        @type processes: C{int}
+        @param coverage: Whether to collect coverage.
+        @type coverage: C{bool}
+        @param timeout: The number of seconds to wait for the workers.
+        @type timeout: C{float}
+        """
+        if shared_memory is None:
+            raise RuntimeError('shared memory is not available')
+        regions = partition(circuit, processes or multiprocessing.cpu_count())
+        owner = {}
+        for i, region in enumerate(regions):
+            for deviceid in region:
+                owner[deviceid] = i
+        self._inputs = list(circuit.inputs)
+        self._outputs = list(circuit.outputs)
+        slots, kinds, values = {}, {}, {}
+        reads = [[] for region in regions]
+        writes = [[] for region in regions]
+
+        def slot(key, value):
+            if not key in slots:
+                slots[key] = len(regions) + 1 + len(slots)
+                kinds[key] = type(value) is bool and bool or int
+                values[slots[key]] = int(value)
+            return slots[key]
+
+        # primary inputs
+        for inputid in self._inputs:
+            if len(circuit._inputs):
+                pins = sorted(circuit._inputs[inputid])
+            else:
+                pins = [inputid]
+            for pin in pins:
+                deviceid, pinid = pin.split('.', 1)
+                key = ('input', inputid)
+                value = circuit[deviceid]._inputs[pinid]
+                reads[owner[deviceid]].append((slot(key, value), kinds[key],
+                    deviceid, pinid))
+        # boundary nets
+        for dst, src in sorted(circuit._connections.items()):
+            if owner[dst[0]] != owner[src[0]]:
+                key = ('net',) + src
+                value = circuit[src[0]]._outputs[src[1]]
+                if not key in slots:
+                    writes[owner[src[0]]].append((slot(key, value),
+                        src[0], src[1], True))
+                reads[owner[dst[0]]].append((slots[key], kinds[key],
+                    dst[0], dst[1]))
+        for senderid, receiverid in _links(circuit):
+            if owner[senderid] != owner[receiverid]:
+                key = ('net', senderid, 'q')
+                value = circuit[senderid]._outputs['q']
+                if not key in slots:
+                    writes[owner[senderid]].append((slot(key, value),
+                        senderid, 'q', True))
+                reads[owner[receiverid]].append((slots[key], kinds[key],
+                    receiverid, None))
+        # primary outputs
+        for outputid in self._outputs:
+            srcoutput = circuit._outputs.get(outputid, outputid)
+            deviceid, pinid = srcoutput.split('.', 1)
+            key = ('output', outputid)
+            value = circuit[deviceid]._outputs[pinid]
+            writes[owner[deviceid]].append((slot(key, value),
+                deviceid, pinid, False))
+        self._slots, self._kinds = slots, kinds
+        self._memory = shared_memory.SharedMemory(create=True,
+            size=8 * (len(regions) + 1 + len(slots)))
+        self._words = self._memory.buf.cast('Q')
+        for i in range(len(regions) + 1):
+            self._words[i] = 0
+        for i in values.keys():
+            self._words[i] = values[i]
+        self._barrier = multiprocessing.Barrier(len(regions) + 1)
+        self._timeout = timeout
+        self._errors = multiprocessing.Queue()
+        self._queue, self._coverage = None, None
+        if coverage:
+            self._queue = multiprocessing.Queue()
+            self._coverage = Coverage(inputs=list(circuit._inputs.keys()),
+                outputs=list(circuit._outputs.keys()))
+        self._workers = [multiprocessing.Process(target=_worker,
+            args=(circuit, regions[i], reads[i], writes[i], i,
+                  self._memory.name, self._barrier, self._queue,
+                  self._errors, timeout)) \
+            for i in range(len(regions))]
+        for worker in self._workers:
+            worker.daemon = True
+            worker.start()
+        self._step()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @property
+    def inputs(self):
+        """\
+        A list of inputs to the simulated circuit.
+        """
+        return list(self._inputs)
+
+    @property
+    def outputs(self):
+        """\
+        A list of outputs from the simulated circuit.
+        """
+        return list(self._outputs)
+
+    @property
+    def regions(self):
+        """\
+        The number of regions (worker processes).
+        """
+        return len(self._workers)
+
+    @property
+    def coverage(self):
+        """\
+        The coverage collected so far, merged from the worker processes, or
+        C{None} if coverage is not being collected.
+        """
+        if self._coverage is None:
+            return None
+        if self._memory is None:
+            raise ValueError('simulator is closed')
+        self._words[0] = COLLECT
+        self._wait()
+        coverage = Coverage().merge(self._coverage)
+        for worker in self._workers:
+            try:
+                coverage.merge(self._queue.get(timeout=self._timeout))
+            except Empty:
+                self._fail('worker did not return coverage')
+        return coverage
+
+    def _fail(self, message):
+        """\
+        Close this simulator after a worker failure, and raise an error with
+        the first error described by the workers, if any.
+
+        @param message: The message if no error was described.
+        @type message: C{str}
+        """
+        try:
+            message = self._errors.get(timeout=1.0)
+        except Empty:
+            pass
+        if self._exited():
+            # a process killed while waiting leaves the barrier unusable
+            for worker in self._workers:
+                worker.terminate()
+                worker.join()
+        else:
+            self._barrier.abort()
+            for worker in self._workers:
+                worker.join(self._timeout)
+                if worker.is_alive():
+                    worker.terminate()
+        self._release()
+        raise RuntimeError('worker simulation failed: %s' % message)
+
+    def _exited(self):
+        """\
+        Return whether any worker process has exited.
+        """
+        return not min([worker.is_alive() for worker in self._workers])
+
+    def _wait(self):
+        """\
+        Wait for the workers at the round barrier.
+        """
+        if self._exited():
+            self._fail('worker exited')
+        try:
+            self._barrier.wait(self._timeout)
+        except threading.BrokenBarrierError:
+            self._fail('worker did not respond')
+
+    def _sample(self):
+        """\
+        Record the current input and output values in the coverage.
+        """
+        for inputid in self._coverage.inputs.keys():
+            key = ('input', inputid)
+            self._coverage.inputs[inputid].add(\
+                self._kinds[key](self._words[self._slots[key]]))
+        for outputid in self._coverage.outputs.keys():
+            self._coverage.outputs[outputid].add(self.get_output(outputid))
+
+    def _step(self):
+        """\
+        Run exchange rounds until no boundary net changes.
+        """
+        if self._memory is None:
+            raise ValueError('simulator is closed')
+        for count in range(ROUNDS):
+            self._words[0] = RUN
+            self._wait()
+            self._wait()
+            self._wait()
+            status = [self._words[1 + i] for i in range(len(self._workers))]
+            if FAILED in status:
+                messages = []
+                for i in range(status.count(FAILED)):
+                    try:
+                        message = self._errors.get(timeout=self._timeout)
+                    except Empty:
+                        message = 'unknown error'
+                    messages.append(message)
+                raise RuntimeError('worker simulation failed: %s' \
+                    % '; '.join(messages))
+            if not CHANGED in status:
+                if self._coverage is not None:
+                    self._sample()
+                return
+        raise RuntimeError('update loop depth exceeded')
+
+    def set_input(self, inputid, value):
+        """\
+        Set an input to a specified value.
+
+        @param inputid: The input ID.
+        @type inputid: C{str}
+        @param value: The value to set.
+        @type value: C{bool} or C{int}
+        """
+        self.apply_inputs({inputid: value})
+
+    def apply_inputs(self, values):
+        """\
+        Apply a set of values to the inputs.
+
+        @param values: The values to apply, keyed by input ID.
+        @type values: C{dict} of C{bool}
+        """
+        for inputid in values.keys():
+            if not ('input', inputid) in self._slots:
+                raise KeyError('no input %s' % inputid)
+            self._words[self._slots[('input', inputid)]] = int(values[inputid])
+        self._step()
+
+    def get_output(self, outputid):
+        """\
+        Get the value of an output.
+
+        @param outputid: The output ID.
+        @type outputid: C{str}
+        """
+        key = ('output', outputid)
+        if not key in self._slots:
+            raise KeyError('no output %s' % outputid)
+        return self._kinds[key](self._words[self._slots[key]])
+
+    def close(self):
+        """\
+        Stop the worker processes and release the shared memory.
+        """
+        if self._memory is None:
+            return
+        self._words[0] = STOP
+        self._wait()
+        for worker in self._workers:
+            worker.join()
+        self._release()
+
+    def _release(self):
+        """\
+        Release the shared memory.
+        """
+        self._words.release()
+        self._memory.close()
+        self._memory.unlink()
+        self._memory = None
@@ -0,0 +1,456 @@
+  #   #               #
+  #   #               #
+### # # ### ### ### ###
+# # # # # # # # # # # #
+### # # ### ###  ## ###
+            #
+            #
+
+"""\
+Satisfiability module.
+
+A conflict-driven clause learning (CDCL) SAT solver with two watched literals
+per clause, first-UIP clause learning, activity-based branching with phase
+saving, and Luby restarts, together with Tseitin encodings of circuits and
+Boolean expressions (by way of And-Inverter Graphs) for satisfiability and
+combinational equivalence queries.
+
+@author: Aaron Mavrinac
+@contact: mavrinac@gmail.com
+@license: GPL-3
+"""
+
+__all__ = ['Solver', 'tseitin_circuit', 'tseitin_expression',
+           'is_satisfiable', 'satisfying_assignment', 'circuits_equivalent']
+
+from heapq import heappush, heappop, heapify
+
+from .aig import AIG, FALSE
+
+
+def luby(i):
+    """\
+    Return the ith element (from 1) of the Luby sequence 1, 1, 2, 1, 1, 2, 4,
+    ...
+
+    @param i: The index.
+    @type i: C{int}
+    @rtype: C{int}
+    """
+    size, sequence, i = 1, 0, i - 1
+    while size < i + 1:
+        sequence += 1
+        size = 2 * size + 1
+    while size - 1 != i:
+        size = (size - 1) >> 1
+        sequence -= 1
+        i = i % size
+    return 1 << sequence
+
+
+class Solver(object):
+    """\
+    CDCL SAT solver class. Variables are positive integers and literals are
+    nonzero integers, negative for negated variables (as in DIMACS).
+    """
+    RESTART = 100
+    DECAY = 0.95
+
+    def __init__(self):
+        """\
+        Constructor.
+        """
+        # per variable (index 0 unused)
+        self._assigns = [None]
+        self._level = [0]
+        self._reason = [None]
+        self._activity = [0.0]
+        self._polarity = [False]
+        # per internal literal (2 * variable + sign)
+        self._watches = [[], []]
+        self._clauses = []
+        self._trail = []
+        self._limits = []
+        self._head = 0
+        self._heap = []
+        self._increment = 1.0
+        self._ok = True
+        self.model = None
+        self.conflicts = 0
+
+    @property
+    def variables(self):
+        """\
+        The number of variables.
+        """
+        return len(self._assigns) - 1
+
+    def new_var(self):
+        """\
+        Add a new variable.
+
+        @return: The variable.
+        @rtype: C{int}
+        """
+        self._assigns.append(None)
+        self._level.append(0)
+        self._reason.append(None)
+        self._activity.append(0.0)
+        self._polarity.append(False)
+        self._watches.extend([[], []])
+        heappush(self._heap, (0.0, self.variables))
+        return self.variables
+
+    def _value(self, literal):
+        """\
+        Return the value of an internal literal, or C{None} if unassigned.
+        """
+        value = self._assigns[literal >> 1]
+        if value is None:
+            return None
+        return value != (literal & 1)
+
+    def _enqueue(self, literal, reason):
+        """\
+        Assign an internal literal true at the current decision level.
+        """
+        var = literal >> 1
+        self._assigns[var] = not literal & 1
+        self._level[var] = len(self._limits)
+        self._reason[var] = reason
+        self._trail.append(literal)
+
+    def add_clause(self, literals):
+        """\
+        Add a clause. Must not be called during solving.
+
+        @param literals: The literals of the clause.
+        @type literals: C{list} of C{int}
+        @return: False if the clause set is now trivially unsatisfiable.
+        @rtype: C{bool}
+        """
+        if not self._ok:
+            return False
+        clause = []
+        for literal in literals:
+            if not literal:
+                raise ValueError('invalid literal 0')
+            while abs(literal) > self.variables:
+                self.new_var()
+            literal = literal > 0 and 2 * literal or 2 * -literal + 1
+            if literal ^ 1 in clause or self._value(literal) is True:
+                return True
+            if not literal in clause and self._value(literal) is not False:
+                clause.append(literal)
+        if not clause:
+            self._ok = False
+        elif len(clause) == 1:
+            self._enqueue(clause[0], None)
+            self._ok = self._propagate() is None
+        else:
+            self._watches[clause[0]].append(len(self._clauses))
+            self._watches[clause[1]].append(len(self._clauses))
+            self._clauses.append(clause)
+        return self._ok
+
+    def _propagate(self):
+        """\
+        Propagate unit clauses over the trail.
+
+        @return: The index of a conflicting clause, or C{None}.
+        @rtype: C{int}
+        """
+        clauses, watches, value = self._clauses, self._watches, self._value
+        while self._head < len(self._trail):
+            false = self._trail[self._head] ^ 1
+            self._head += 1
+            watchers = watches[false]
+            kept = []
+            for i in range(len(watchers)):
+                index = watchers[i]
+                clause = clauses[index]
+                if clause[0] == false:
+                    clause[0], clause[1] = clause[1], clause[0]
+                if value(clause[0]) is True:
+                    kept.append(index)
+                    continue
+                for k in range(2, len(clause)):
+                    if value(clause[k]) is not False:
+                        clause[1], clause[k] = clause[k], clause[1]
+                        watches[clause[1]].append(index)
+                        break
+                else:
+                    kept.append(index)
+                    if value(clause[0]) is False:
+                        kept.extend(watchers[i + 1:])
+                        watches[false] = kept
+                        self._head = len(self._trail)
+                        return index
+                    self._enqueue(clause[0], index)
+            watches[false] = kept
+        return None
+
+    def _bump(self, var):
+        """\
+        Increase the activity of a variable.
+        """
+        self._activity[var] += self._increment
+        if self._activity[var] > 1e100:
+            self._activity = [activity * 1e-100 for activity in self._activity]
+            self._increment *= 1e-100
+            self._heap = [(-self._activity[v], v) \
+                for v in range(1, len(self._assigns)) \
+                if self._assigns[v] is None]
+            heapify(self._heap)
+        elif self._assigns[var] is None:
+            heappush(self._heap, (-self._activity[var], var))
+
+    def _analyze(self, conflict):
+        """\
+        Derive a first-UIP learnt clause from a conflict.
+
+        @param conflict: The index of the conflicting clause.
+        @type conflict: C{int}
+        @return: The learnt clause (asserting literal first) and the level to
+                 backjump to.
+        @rtype: C{tuple}
+        """
+        learnt, seen = [None], set()
+        counter, literal, index = 0, None, len(self._trail) - 1
+        level = len(self._limits)
+        clause = self._clauses[conflict]
+        while True:
+            for other in (literal is None and clause or clause[1:]):
+                var = other >> 1
+                if not var in seen and self._level[var] > 0:
+                    seen.add(var)
+                    self._bump(var)
+                    if self._level[var] >= level:
+                        counter += 1
+                    else:
+                        learnt.append(other)
+            while not self._trail[index] >> 1 in seen:
+                index -= 1
+            literal = self._trail[index]
+            index -= 1
+            seen.discard(literal >> 1)
+            counter -= 1
+            if not counter:
+                break
+            clause = self._clauses[self._reason[literal >> 1]]
+        learnt[0] = literal ^ 1
+        if len(learnt) == 1:
+            return learnt, 0
+        best = max(range(1, len(learnt)),
+                   key=lambda i: self._level[learnt[i] >> 1])
+        learnt[1], learnt[best] = learnt[best], learnt[1]
+        return learnt, self._level[learnt[1] >> 1]
+
+    def _backtrack(self, level):
+        """\
+        Undo all assignments above a decision level.
+        """
+        if len(self._limits) <= level:
+            return
+        for literal in self._trail[self._limits[level]:]:
+            var = literal >> 1
+            self._polarity[var] = self._assigns[var]
+            self._assigns[var] = None
+            self._reason[var] = None
+            heappush(self._heap, (-self._activity[var], var))
+        del self._trail[self._limits[level]:]
+        del self._limits[level:]
+        self._head = len(self._trail)
+
+    def _decide(self):
+        """\
+        Select an unassigned variable of greatest activity.
+
+        @return: The variable, or C{None} if all are assigned.
+        @rtype: C{int}
+        """
+        while self._heap:
+            activity, var = heappop(self._heap)
+            if self._assigns[var] is None and -activity == self._activity[var]:
+                return var
+        for var in range(1, len(self._assigns)):
+            if self._assigns[var] is None:
+                return var
+        return None
+
+    def solve(self):
+        """\
+        Determine whether the clauses are satisfiable. If so, a satisfying
+        assignment is stored in C{model}.
+
+        @return: True if satisfiable.
+        @rtype: C{bool}
+        """
+        self.model = None
+        if not self._ok or self._propagate() is not None:
+            self._ok = False
+            return False
+        restarts, budget = 1, self.RESTART * luby(1)
+        while True:
+            conflict = self._propagate()
+            if conflict is not None:
+                self.conflicts += 1
+                budget -= 1
+                if not self._limits:
+                    self._ok = False
+                    return False
+                learnt, level = self._analyze(conflict)
+                self._backtrack(level)
+                if len(learnt) == 1:
+                    self._enqueue(learnt[0], None)
+                else:
+                    self._watches[learnt[0]].append(len(self._clauses))
+                    self._watches[learnt[1]].append(len(self._clauses))
+                    self._clauses.append(learnt)
+                    self._enqueue(learnt[0], len(self._clauses) - 1)
+                self._increment /= self.DECAY
+            elif budget <= 0:
+                restarts += 1
+                budget = self.RESTART * luby(restarts)
+                self._backtrack(0)
+            else:
+                var = self._decide()
+                if var is None:
+                    self.model = dict((v, self._assigns[v]) \
+                        for v in range(1, len(self._assigns)))
+                    self._backtrack(0)
+                    return True
+                self._limits.append(len(self._trail))
+                self._enqueue(2 * var + (not self._polarity[var]), None)
+
+
+def _encode(aig, solver, literals):
+    """\
+    Tseitin-encode the cone of some graph literals into a solver.
+
+    @return: The solver literal of each graph literal, and the solver variable
+             of each graph input in the cone, keyed by input name.
+    @rtype: C{tuple} of C{list} of C{int} and C{dict} of C{int}
+    """
+    variables = {}
+    stack = [literal >> 1 for literal in literals]
+    while stack:
+        node = stack.pop()
+        if node in variables:
+            continue
+        variables[node] = None
+        fanins = aig.fanins(2 * node)
+        if fanins:
+            stack.extend([fanins[0] >> 1, fanins[1] >> 1])
+    lit = lambda literal: (literal & 1 and -1 or 1) * variables[literal >> 1]
+    for node in sorted(variables.keys()):
+        variables[node] = solver.new_var()
+        fanins = aig.fanins(2 * node)
+        if node == 0:
+            solver.add_clause([-variables[node]])
+        elif fanins:
+            solver.add_clause([-variables[node], lit(fanins[0])])
+            solver.add_clause([-variables[node], lit(fanins[1])])
+            solver.add_clause([variables[node], -lit(fanins[0]),
+                               -lit(fanins[1])])
+    inputs = dict((name, variables[aig.input(name) >> 1]) \
+        for name in aig.inputs if aig.input(name) >> 1 in variables)
+    return [lit(literal) for literal in literals], inputs
+
+
+def tseitin_circuit(circuit, solver):
+    """\
+    Tseitin-encode a combinational circuit into a solver.
+
+    @param circuit: The circuit.
+    @type circuit: L{Circuit}
+    @param solver: The solver.
+    @type solver: L{Solver}
+    @return: The solver variables of the circuit inputs and the solver
+             literals of the circuit outputs, keyed by input and output ID.
+    @rtype: C{tuple} of C{dict}
+    """
+    aig = AIG.from_circuit(circuit)
+    literals, inputs = _encode(aig, solver,
+        [aig.output(outputid) for outputid in aig.outputs])
+    return inputs, dict(zip(aig.outputs, literals))
+
+
+def tseitin_expression(expression, solver):
+    """\
+    Tseitin-encode a Boolean expression into a solver.
+
+    @param expression: The Boolean expression.
+    @type expression: L{BooleanExpression}
+    @param solver: The solver.
+    @type solver: L{Solver}
+    @return: The solver variables of the expression variables, keyed by
+             variable, and the solver literal of the expression.
+    @rtype: C{tuple} of C{dict} and C{int}
+    """
+    aig = AIG()
+    literals, inputs = _encode(aig, solver, [aig.add_expression(expression)])
+    return inputs, literals[0]
+
+
+def satisfying_assignment(expression):
+    """\
+    Find an assignment of variables satisfying a Boolean expression.
+
+    @param expression: The Boolean expression.
+    @type expression: L{BooleanExpression}
+    @return: The variable values, or C{None} if unsatisfiable.
+    @rtype: C{dict} of C{bool}
+    """
+    solver = Solver()
+    inputs, literal = tseitin_expression(expression, solver)
+    solver.add_clause([literal])
+    if not solver.solve():
+        return None
+    values = dict((variable, False) for variable in expression.variables)
+    for variable in inputs.keys():
+        values[variable] = solver.model[inputs[variable]]
+    return values
+
+
+def is_satisfiable(expression):
+    """\
+    Determine whether a Boolean expression is satisfiable.
+
+    @param expression: The Boolean expression.
+    @type expression: L{BooleanExpression}
+    @rtype: C{bool}
+    """
+    return satisfying_assignment(expression) is not None
+
+
+def circuits_equivalent(first, second):
+    """\
+    Determine whether two combinational circuits with the same outputs compute
+    the same functions of their inputs (matched by ID), by solving a miter.
+
+    @param first: The first circuit.
+    @type first: L{Circuit}
+    @param second: The second circuit.
+    @type second: L{Circuit}
+    @return: Whether the circuits are equivalent and, if not, input values
+             for which some output differs.
+    @rtype: C{tuple} of C{bool} and C{dict} of C{bool}
+    """
+    if first.outputs != second.outputs:
+        raise ValueError('circuits have different outputs')
+    aig = AIG()
+    outputs = [aig.add_circuit(first), aig.add_circuit(second)]
+    miter = aig.reduce(aig.OR, [aig.XOR(outputs[0][outputid],
+        outputs[1][outputid]) for outputid in first.outputs], empty=FALSE)
+    if miter == FALSE:
+        return True, None
+    solver = Solver()
+    literals, inputs = _encode(aig, solver, [miter])
+    solver.add_clause(literals)
+    if not solver.solve():
+        return True, None
+    values = dict((name, False) for name in aig.inputs)
+    for name in inputs.keys():
+        values[name] = solver.model[inputs[name]]
+    return False, values
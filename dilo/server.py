@@ -0,0 +1,518 @@
+  #   #               #
+  #   #               #
+### # # ### ### ### ###
+# # # # # # # # # # # #
+### # # ### ###  ## ###
+            #
+            #
+
+
+"""\
+Simulation server module (Python 3 only). Circuits are held in memory by an
+asyncio server and driven over a Unix or localhost socket with a compact
+binary protocol.
+
+Each request frame is a header of payload length, request ID, and opcode
+(network order C{!IIB}) followed by the payload; each response frame has the
+same header with a status in place of the opcode. Requests are processed
+concurrently and responses may arrive out of order, matched by request ID.
+Payloads are built from names (C{!H} length and UTF-8 bytes) and vectors,
+which pack the values of the sorted inputs or outputs of a circuit into bits,
+first port most significant, padded to whole bytes. Only circuits whose
+ports are all single-bit may be served.
+
+@author: Aaron Mavrinac
+@contact: mavrinac@gmail.com
+@license: GPL-3
+"""
+
+__all__ = ['SimulationClient', 'SimulationServer']
+
+import asyncio
+import pickle
+import struct
+from concurrent.futures import ProcessPoolExecutor
+
+HEADER = struct.Struct('!IIB')
+COUNT = struct.Struct('!I')
+LENGTH = struct.Struct('!H')
+# maximum payload length
+MAX_PAYLOAD = 1 << 26
+
+# opcodes
+INFO, APPLY, SWEEP, GET = 0, 1, 2, 3
+# statuses
+OK, ERROR = 0, 1
+
+
+def _pack_name(name):
+    """\
+    Pack a name.
+
+    @param name: The name.
+    @type name: C{str}
+    @rtype: C{bytes}
+    """
+    data = name.encode('utf-8')
+    return LENGTH.pack(len(data)) + data
+
+
+def _unpack_name(payload, offset=0):
+    """\
+    Unpack a name.
+
+    @param payload: The payload.
+    @type payload: C{bytes}
+    @param offset: The offset of the name in the payload.
+    @type offset: C{int}
+    @return: The name and the offset following it.
+    @rtype: C{tuple}
+    """
+    length, = LENGTH.unpack_from(payload, offset)
+    offset += LENGTH.size
+    if offset + length > len(payload):
+        raise ValueError('truncated name')
+    return payload[offset:offset + length].decode('utf-8'), offset + length
+
+
+def _pack_vector(ports, values):
+    """\
+    Pack the values of a list of ports into a vector.
+
+    @param ports: The port IDs.
+    @type ports: C{list} of C{str}
+    @param values: The values, keyed by port ID.
+    @type values: C{dict} of C{bool}
+    @rtype: C{bytes}
+    """
+    bits = 0
+    for portid in ports:
+        bits = bits << 1 | bool(values[portid])
+    return bits.to_bytes((len(ports) + 7) >> 3, 'big')
+
+
+def _unpack_vector(ports, data):
+    """\
+    Unpack a vector into the values of a list of ports.
+
+    @param ports: The port IDs.
+    @type ports: C{list} of C{str}
+    @param data: The vector.
+    @type data: C{bytes}
+    @return: The values, keyed by port ID.
+    @rtype: C{dict} of C{bool}
+    """
+    bits = int.from_bytes(data, 'big')
+    return dict((portid, bool(bits >> (len(ports) - i - 1) & 1)) \
+        for i, portid in enumerate(ports))
+
+
+def _apply(circuit, vectors):
+    """\
+    Apply packed input vectors to a circuit in order.
+
+    @param circuit: The circuit.
+    @type circuit: L{Circuit}
+    @param vectors: The packed input vectors.
+    @type vectors: C{list} of C{bytes}
+    @return: The packed output vectors.
+    @rtype: C{bytes}
+    """
+    inputs, outputs = circuit.inputs, circuit.outputs
+    result = []
+    for vector in vectors:
+        circuit.apply_inputs(_unpack_vector(inputs, vector))
+        result.append(_pack_vector(outputs, dict((outputid,
+            circuit.get_output(outputid)) for outputid in outputs)))
+    return b''.join(result)
+
+
+def _sweep(data, vectors):
+    """\
+    Apply packed input vectors in order to a pickled snapshot of a circuit.
+    Run in a worker process.
+
+    @param data: The pickled circuit.
+    @type data: C{bytes}
+    @param vectors: The packed input vectors.
+    @type vectors: C{list} of C{bytes}
+    @return: The packed output vectors.
+    @rtype: C{bytes}
+    """
+    return _apply(pickle.loads(data), vectors)
+
+
+class SimulationServer(object):
+    """\
+    Simulation server class. Requests on the same circuit are serialized by a
+    per-circuit lock, and run in a thread so that the event loop is never
+    blocked; sweeps run on a snapshot of the circuit in a process pool.
+
+      - C{INFO}: payload name; response the input and output IDs, each as a
+        count and names.
+      - C{GET}: payload name; response the packed current output vector.
+      - C{APPLY}: payload name, count, and packed input vectors; applies them
+        in order to the circuit, and responds with the packed output vector
+        following each.
+      - C{SWEEP}: as C{APPLY}, but applied to a snapshot of the circuit, which
+        is left unchanged.
+    """
+    def __init__(self, processes=None):
+        """\
+        Constructor.
+
+        @param processes: The number of sweep worker processes (defaults to
+                          the number of CPUs).
+        @type processes: C{int}
+        """
+        self._circuits = {}
+        self._locks = {}
+        self._processes = processes
+        self._executor = None
+        self._server = None
+        self._handlers = set()
+
+    def add(self, name, circuit):
+        """\
+        Add a circuit to be served.
+
+        @param name: The name to serve the circuit under.
+        @type name: C{str}
+        @param circuit: The circuit.
+        @type circuit: L{Circuit}
+        @raise ValueError: The circuit has a port which is not a single bit.
+        """
+        if name in self._circuits:
+            raise ValueError('duplicate circuit name')
+        for inputid in circuit.inputs:
+            if type(circuit._get_input(inputid)) is not bool:
+                raise ValueError('input %s is not a single bit' % inputid)
+        for outputid in circuit.outputs:
+            if type(circuit.get_output(outputid)) is not bool:
+                raise ValueError('output %s is not a single bit' % outputid)
+        self._circuits[name] = circuit
+
+    def remove(self, name):
+        """\
+        Stop serving a circuit.
+
+        @param name: The name of the circuit.
+        @type name: C{str}
+        """
+        del self._circuits[name]
+        self._locks.pop(name, None)
+
+    @property
+    def address(self):
+        """\
+        The address the server is listening on.
+        """
+        return self._server.sockets[0].getsockname()
+
+    async def start(self, path=None, host='127.0.0.1', port=0):
+        """\
+        Start listening, on a Unix socket if a path is given and on a TCP
+        socket otherwise.
+
+        @param path: The Unix socket path.
+        @type path: C{str}
+        @param host: The TCP host.
+        @type host: C{str}
+        @param port: The TCP port (defaults to any free port).
+        @type port: C{int}
+        """
+        if path is not None:
+            self._server = await asyncio.start_unix_server(self._handle, path)
+        else:
+            self._server = await asyncio.start_server(self._handle, host, port)
+
+    async def serve_forever(self):
+        """\
+        Serve until cancelled.
+        """
+        await self._server.serve_forever()
+
+    async def close(self):
+        """\
+        Stop listening, close open connections, and shut down the process
+        pool.
+        """
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        for handler in list(self._handlers):
+            handler.cancel()
+        if self._handlers:
+            await asyncio.wait(self._handlers)
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    async def _handle(self, reader, writer):
+        """\
+        Handle a connection, processing its requests concurrently.
+
+        @param reader: The connection reader.
+        @type reader: C{asyncio.StreamReader}
+        @param writer: The connection writer.
+        @type writer: C{asyncio.StreamWriter}
+        """
+        handler = asyncio.current_task()
+        self._handlers.add(handler)
+        tasks = set()
+        try:
+            while True:
+                try:
+                    header = await reader.readexactly(HEADER.size)
+                except asyncio.IncompleteReadError:
+                    break
+                length, requestid, opcode = HEADER.unpack(header)
+                if length > MAX_PAYLOAD:
+                    break
+                payload = await reader.readexactly(length)
+                task = asyncio.ensure_future(\
+                    self._respond(writer, requestid, opcode, payload))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.wait(tasks)
+        except (asyncio.IncompleteReadError, asyncio.CancelledError,
+                ConnectionError):
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            writer.close()
+            self._handlers.discard(handler)
+
+    async def _respond(self, writer, requestid, opcode, payload):
+        """\
+        Process a request and write its response.
+        """
+        try:
+            status, payload = OK, await self._dispatch(opcode, payload)
+        except Exception as error:
+            status, payload = ERROR, str(error).encode('utf-8')
+        writer.write(HEADER.pack(len(payload), requestid, status) + payload)
+        await writer.drain()
+
+    async def _dispatch(self, opcode, payload):
+        """\
+        Process a request.
+
+        @param opcode: The opcode.
+        @type opcode: C{int}
+        @param payload: The request payload.
+        @type payload: C{bytes}
+        @return: The response payload.
+        @rtype: C{bytes}
+        """
+        name, offset = _unpack_name(payload)
+        if not name in self._circuits:
+            raise KeyError('no circuit %s' % name)
+        circuit = self._circuits[name]
+        if not name in self._locks:
+            self._locks[name] = asyncio.Lock()
+        lock = self._locks[name]
+        loop = asyncio.get_running_loop()
+        if opcode == INFO:
+            return b''.join([COUNT.pack(len(ports)) \
+                + b''.join([_pack_name(portid) for portid in ports]) \
+                for ports in [circuit.inputs, circuit.outputs]])
+        elif opcode == GET:
+            async with lock:
+                return _pack_vector(circuit.outputs, dict((outputid,
+                    circuit.get_output(outputid)) \
+                    for outputid in circuit.outputs))
+        elif not opcode in (APPLY, SWEEP):
+            raise ValueError('unknown opcode %d' % opcode)
+        count, = COUNT.unpack_from(payload, offset)
+        offset += COUNT.size
+        size = (len(circuit.inputs) + 7) >> 3
+        if len(payload) != offset + count * size:
+            raise ValueError('malformed vectors')
+        vectors = [payload[offset + i * size:offset + (i + 1) * size] \
+            for i in range(count)]
+        async with lock:
+            if opcode == APPLY:
+                return await loop.run_in_executor(None, _apply, circuit,
+                                                  vectors)
+            data = await loop.run_in_executor(None, pickle.dumps, circuit)
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(self._processes)
+        return await loop.run_in_executor(self._executor, _sweep, data,
+                                          vectors)
+
+
+class SimulationClient(object):
+    """\
+    Simulation client class. Requests may be issued concurrently over the
+    same connection.
+    """
+    def __init__(self, reader, writer):
+        """\
+        Constructor. Use L{connect} to open a connection.
+
+        @param reader: The connection reader.
+        @type reader: C{asyncio.StreamReader}
+        @param writer: The connection writer.
+        @type writer: C{asyncio.StreamWriter}
+        """
+        self._reader = reader
+        self._writer = writer
+        self._pending = {}
+        self._requestid = 0
+        self._ports = {}
+        self._task = asyncio.ensure_future(self._receive())
+
+    @classmethod
+    async def connect(cls, path=None, host='127.0.0.1', port=None):
+        """\
+        Connect to a server, on a Unix socket if a path is given and on a TCP
+        socket otherwise.
+
+        @param path: The Unix socket path.
+        @type path: C{str}
+        @param host: The TCP host.
+        @type host: C{str}
+        @param port: The TCP port.
+        @type port: C{int}
+        @rtype: L{SimulationClient}
+        """
+        if path is not None:
+            reader, writer = await asyncio.open_unix_connection(path)
+        else:
+            reader, writer = await asyncio.open_connection(host, port)
+        return cls(reader, writer)
+
+    async def _receive(self):
+        """\
+        Receive responses and resolve the pending requests they answer. When
+        the connection is lost or closed, the pending requests fail.
+        """
+        error = ConnectionError('connection closed')
+        try:
+            while True:
+                header = await self._reader.readexactly(HEADER.size)
+                length, requestid, status = HEADER.unpack(header)
+                payload = await self._reader.readexactly(length)
+                future = self._pending.pop(requestid, None)
+                if future is None or future.done():
+                    continue
+                if status == OK:
+                    future.set_result(payload)
+                else:
+                    future.set_exception(\
+                        RuntimeError(payload.decode('utf-8')))
+        except (asyncio.IncompleteReadError, ConnectionError) as exception:
+            error = ConnectionError(str(exception))
+        finally:
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(error)
+            self._pending.clear()
+
+    async def request(self, opcode, payload):
+        """\
+        Send a request and wait for its response.
+
+        @param opcode: The opcode.
+        @type opcode: C{int}
+        @param payload: The request payload.
+        @type payload: C{bytes}
+        @return: The response payload.
+        @rtype: C{bytes}
+        @raise ConnectionError: The connection has been lost or closed.
+        """
+        if self._task.done():
+            raise ConnectionError('connection closed')
+        self._requestid = (self._requestid + 1) & 0xffffffff
+        future = asyncio.get_running_loop().create_future()
+        self._pending[self._requestid] = future
+        self._writer.write(HEADER.pack(len(payload), self._requestid, opcode) \
+            + payload)
+        await self._writer.drain()
+        return await future
+
+    async def info(self, name):
+        """\
+        Get the inputs and outputs of a circuit.
+
+        @param name: The name of the circuit.
+        @type name: C{str}
+        @return: The input IDs and the output IDs.
+        @rtype: C{tuple} of C{list} of C{str}
+        """
+        if not name in self._ports:
+            payload = await self.request(INFO, _pack_name(name))
+            ports, offset = [], 0
+            for i in range(2):
+                count, = COUNT.unpack_from(payload, offset)
+                offset += COUNT.size
+                ports.append([])
+                for j in range(count):
+                    portid, offset = _unpack_name(payload, offset)
+                    ports[-1].append(portid)
+            self._ports[name] = tuple(ports)
+        return self._ports[name]
+
+    async def get_output(self, name):
+        """\
+        Get the current outputs of a circuit.
+
+        @param name: The name of the circuit.
+        @type name: C{str}
+        @return: The output values, keyed by output ID.
+        @rtype: C{dict} of C{bool}
+        """
+        inputs, outputs = await self.info(name)
+        return _unpack_vector(outputs,
+            await self.request(GET, _pack_name(name)))
+
+    async def _vectors(self, opcode, name, vectors):
+        """\
+        Send a batch of input vectors and unpack the output vectors.
+        """
+        inputs, outputs = await self.info(name)
+        payload = await self.request(opcode, _pack_name(name) \
+            + COUNT.pack(len(vectors)) \
+            + b''.join([_pack_vector(inputs, values) for values in vectors]))
+        size = (len(outputs) + 7) >> 3
+        return [_unpack_vector(outputs, payload[i * size:(i + 1) * size]) \
+            for i in range(len(vectors))]
+
+    async def apply_inputs(self, name, vectors):
+        """\
+        Apply a batch of input vectors to a circuit in order.
+
+        @param name: The name of the circuit.
+        @type name: C{str}
+        @param vectors: The input values of each vector, keyed by input ID.
+        @type vectors: C{list} of C{dict} of C{bool}
+        @return: The output values following each vector, keyed by output ID.
+        @rtype: C{list} of C{dict} of C{bool}
+        """
+        return await self._vectors(APPLY, name, vectors)
+
+    async def sweep(self, name, vectors):
+        """\
+        Apply a batch of input vectors in order to a snapshot of a circuit,
+        leaving the circuit unchanged.
+
+        @param name: The name of the circuit.
+        @type name: C{str}
+        @param vectors: The input values of each vector, keyed by input ID.
+        @type vectors: C{list} of C{dict} of C{bool}
+        @return: The output values following each vector, keyed by output ID.
+        @rtype: C{list} of C{dict} of C{bool}
+        """
+        return await self._vectors(SWEEP, name, vectors)
+
+    async def close(self):
+        """\
+        Close the connection.
+        """
+        self._writer.close()
+        await self._writer.wait_closed()
+        self._task.cancel()
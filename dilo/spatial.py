@@ -0,0 +1,199 @@
+  #   #               #
+  #   #               #
+### # # ### ### ### ###
+# # # # # # # # # # # #
+### # # ### ###  ## ###
+            #
+            #
+
+"""\
+Spatial index module.
+
+@author: Aaron Mavrinac
+@contact: mavrinac@gmail.com
+@license: GPL-3
+"""
+
+__all__ = ['SpatialIndex']
+
+# rectangles overlapping more grid cells than this are kept in a list examined
+# by every query, rather than in the bucket of every cell they overlap
+LARGE = 64
+
+
+class SpatialIndex(object):
+    """\
+    Uniform grid spatial index of axis-aligned rectangles. Each rectangle is
+    stored in the bucket of every grid cell it overlaps, so queries only
+    examine the buckets covering the query region. The bounding box of all
+    rectangles is kept incrementally.
+    """
+    def __init__(self, cell=100):
+        """\
+        Constructor.
+
+        @param cell: The grid cell size.
+        @type cell: C{int}
+        """
+        self._cell = cell
+        self._buckets = {}
+        self._large = set()
+        self._rects = {}
+        # extent of the bounding box (-left, -top, right, bottom), the number
+        # of rectangles on each of its edges, and whether it must be recomputed
+        self._box = None
+        self._edges = [0, 0, 0, 0]
+        self._stale = False
+
+    def __len__(self):
+        return len(self._rects)
+
+    def __contains__(self, key):
+        return key in self._rects
+
+    def _range(self, rect):
+        """\
+        Return the range of grid cells overlapped by a rectangle, as the
+        first and last column and row.
+        """
+        x, y, width, height = rect
+        cell = self._cell
+        return (int(x // cell), int((x + max(width, 1) - 1) // cell),
+                int(y // cell), int((y + max(height, 1) - 1) // cell))
+
+    def _cells(self, rect):
+        """\
+        Return the grid cells overlapped by a rectangle, or C{None} if it is
+        large.
+        """
+        left, right, top, bottom = self._range(rect)
+        if (right - left + 1) * (bottom - top + 1) > LARGE:
+            return None
+        return [(i, j) for i in range(left, right + 1) \
+            for j in range(top, bottom + 1)]
+
+    def _grow(self, rect):
+        """\
+        Grow the bounding box to include a rectangle.
+        """
+        if self._stale:
+            return
+        x, y, width, height = rect
+        extent = (-x, -y, x + width, y + height)
+        if self._box is None:
+            self._box, self._edges = list(extent), [1, 1, 1, 1]
+            return
+        for i in range(4):
+            if extent[i] > self._box[i]:
+                self._box[i], self._edges[i] = extent[i], 1
+            elif extent[i] == self._box[i]:
+                self._edges[i] += 1
+
+    def _shrink(self, rect):
+        """\
+        Account for the removal of a rectangle from the bounding box, which
+        becomes stale if it was the last rectangle on one of its edges.
+        """
+        if self._stale or self._box is None:
+            return
+        x, y, width, height = rect
+        extent = (-x, -y, x + width, y + height)
+        for i in range(4):
+            if extent[i] == self._box[i]:
+                self._edges[i] -= 1
+                if not self._edges[i]:
+                    self._stale = True
+
+    def insert(self, key, rect):
+        """\
+        Insert a rectangle, replacing any previous rectangle with the same key.
+
+        @param key: The key.
+        @type key: C{object}
+        @param rect: The rectangle (x, y, width, height).
+        @type rect: C{tuple} of C{int}
+        """
+        rect = tuple(rect)
+        if key in self._rects:
+            if self._range(self._rects[key]) == self._range(rect):
+                self._grow(rect)
+                self._shrink(self._rects[key])
+                self._rects[key] = rect
+                return
+            self.remove(key)
+        self._rects[key] = rect
+        self._grow(rect)
+        cells = self._cells(rect)
+        if cells is None:
+            self._large.add(key)
+            return
+        for cell in cells:
+            self._buckets.setdefault(cell, set()).add(key)
+
+    def remove(self, key):
+        """\
+        Remove a rectangle.
+
+        @param key: The key.
+        @type key: C{object}
+        """
+        rect = self._rects.pop(key)
+        self._shrink(rect)
+        if key in self._large:
+            self._large.discard(key)
+            return
+        for cell in self._cells(rect):
+            self._buckets[cell].discard(key)
+            if not self._buckets[cell]:
+                del self._buckets[cell]
+
+    def query(self, rect):
+        """\
+        Find the rectangles intersecting a rectangle.
+
+        @param rect: The query rectangle (x, y, width, height).
+        @type rect: C{tuple} of C{int}
+        @return: The keys of the intersecting rectangles.
+        @rtype: C{set}
+        """
+        x, y, width, height = rect
+        left, right, top, bottom = self._range(rect)
+        candidates = set(self._large)
+        for i in range(left, right + 1):
+            for j in range(top, bottom + 1):
+                candidates.update(self._buckets.get((i, j), ()))
+        found = set()
+        for key in candidates:
+            kx, ky, kwidth, kheight = self._rects[key]
+            if kx < x + width and x < kx + kwidth \
+            and ky < y + height and y < ky + kheight:
+                found.add(key)
+        return found
+
+    def at(self, point):
+        """\
+        Find the rectangles containing a point.
+
+        @param point: The point (x, y).
+        @type point: C{tuple} of C{int}
+        @return: The keys of the containing rectangles.
+        @rtype: C{set}
+        """
+        return self.query((point[0], point[1], 1, 1))
+
+    def bounds(self):
+        """\
+        Find the bounding box of all rectangles.
+
+        @return: The bounding box (x, y, width, height), or C{None} if the
+                 index is empty.
+        @rtype: C{tuple} of C{int}
+        """
+        if self._stale:
+            self._box, self._stale = None, False
+            for rect in self._rects.values():
+                self._grow(rect)
+        if self._box is None:
+            return None
+        left, top, right, bottom = self._box
+        return (-left, -top, right + left, bottom + top)
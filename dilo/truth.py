@@ -26,4 +26,4 @@ def binary_combinations(variables, combination={}):
             for subcomb in binary_combinations(variables, combination):
                 yield subcomb
         else:
-            yield combination
+            yield copy(combination)
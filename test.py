@@ -8,31 +8,58 @@ Unit tests for Dilopad.
 @license: GPL-3
 """
 
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
 import unittest
 
+from dilo.aig import *
 from dilo.boolean import *
+from dilo.coverage import *
 from dilo.device import *
+from dilo.fault import *
+from dilo.optimize import *
+from dilo.parallel import *
+from dilo.sat import *
+from dilo.spatial import *
 from dilo.truth import *
 from dilo.devices.basic import *
+from dilo.devices.bus import *
 from dilo.devices.gates import *
+from dilo.devices.lut import *
+if sys.version_info >= (3, 7):
+    import asyncio
+    from dilo.server import *
+
+
+def example_circuit():
+    """\
+    Build the example circuit F = x' * y + (x + z)' shared by several tests.
+    """
+    C = Circuit()
+    C.add('one', Inverter())
+    C.add('two', ANDGate())
+    C.add('three', ORGate())
+    C.add('four', Inverter())
+    C.add('five', ORGate())
+    C.connect('one', 'q', 'two', 'a')
+    C.connect('two', 'q', 'five', 'a')
+    C.connect('three', 'q', 'four', 'a')
+    C.connect('four', 'q', 'five', 'b')
+    C.label_inputs('x', ['one.a', 'three.a'])
+    C.label_inputs('y', ['two.b'])
+    C.label_inputs('z', ['three.b'])
+    C.label_output('F', 'five.q')
+    return C
 
 
 class TestCircuit(unittest.TestCase):
     def setUp(self):
-        self.C = Circuit()
-        self.C.add('one', Inverter())
-        self.C.add('two', ANDGate())
-        self.C.add('three', ORGate())
-        self.C.add('four', Inverter())
-        self.C.add('five', ORGate())
-        self.C.connect('one', 'q', 'two', 'a')
-        self.C.connect('two', 'q', 'five', 'a')
-        self.C.connect('three', 'q', 'four', 'a')
-        self.C.connect('four', 'q', 'five', 'b')
-        self.C.label_inputs('x', ['one.a', 'three.a'])
-        self.C.label_inputs('y', ['two.b'])
-        self.C.label_inputs('z', ['three.b'])
-        self.C.label_output('F', 'five.q')
+        self.C = example_circuit()
 
     def test_function(self):
         result = []
@@ -53,6 +80,963 @@ class TestCircuit(unittest.TestCase):
         self.C.remove('five')
         self.assertEqual(self.C.outputs, ['four.q', 'two.q'])
 
+    def test_replace(self):
+        self.C.replace('five', NORGate())
+        self.C.replace('two', NANDGate(width=3), inputmap={'a': 'two.a',
+            'b': 'two.b', 'c': 'three.b'})
+        self.assertEqual(self.C.inputs, ['x', 'y', 'z'])
+        self.assertEqual(self.C.outputs, ['F'])
+        result = []
+        for values in binary_combinations(self.C.inputs):
+            self.C.apply_inputs(values)
+            result.append(self.C.get_output('F'))
+        self.assertEqual(result, [False] * 3 + [True] + [False] * 4)
+
+    def test_disconnect(self):
+        self.C.apply_inputs({'x': False, 'y': True, 'z': True})
+        self.assertTrue(self.C.get_output('F'))
+        self.C.disconnect('two', 'a')
+        self.assertFalse(self.C['two'].get_output('q'))
+        self.assertFalse(self.C.get_output('F'))
+        self.C.remove('two')
+        self.assertFalse(self.C['five']._inputs['a'])
+        ring = Circuit()
+        ring.add('n', Inverter())
+        self.assertRaises(RuntimeError, ring.connect, 'n', 'q', 'n', 'a')
+
+    def test_disconnect_nested(self):
+        S = Circuit()
+        S.add('g', Inverter())
+        T = Circuit()
+        T.add('b', BusInverter(width=4))
+        T.label_inputs('a', ['b.a'])
+        T.label_output('q', 'b.q')
+        C = Circuit()
+        C.add('one', Logic1())
+        C.add('k', BusConstant(value=5, width=4))
+        C.add('s', S)
+        C.add('t', T)
+        C.connect('one', 'q', 's', 'g.a')
+        C.connect('k', 'q', 't', 'a')
+        self.assertEqual((C.get_output('s.g.q'), C.get_output('t.q')),
+                         (False, 10))
+        C.remove('one')
+        self.assertTrue(C.get_output('s.g.q'))
+        C.disconnect('t', 'a')
+        self.assertEqual(C.get_output('t.q'), 15)
+
+    def test_incremental(self):
+        evaluations = []
+
+        class Probe(Buffer):
+            def _update(self):
+                evaluations.append(self)
+                super(Probe, self)._update()
+
+        C = Circuit()
+        for i in range(50):
+            C.add('p%d' % i, Probe())
+            if i:
+                C.connect('p%d' % (i - 1), 'q', 'p%d' % i, 'a')
+        C.add('n', Inverter())
+        C.add('m', Probe())
+        del evaluations[:]
+        C.connect('n', 'q', 'm', 'a')
+        C.set_input('n.a', True)
+        self.assertEqual(len(evaluations), 2)
+        C.set_input('p0.a', True)
+        self.assertEqual(len(evaluations), 3)
+        C.set_input('p0.a', False)
+        self.assertEqual(len(evaluations), 53)
+        self.assertFalse(C.get_output('p49.q'))
+
+    def test_expressions(self):
+        F = self.C.expressions()['F']
+        self.assertEqual(F.variables, ['x', 'y', 'z'])
+        for values in binary_combinations(self.C.inputs):
+            self.C.apply_inputs(values)
+            self.assertEqual(F.evaluate(values), self.C.get_output('F'))
+        G = BooleanExpression(F.expression)
+        for values in binary_combinations(self.C.inputs):
+            self.assertEqual(G.evaluate(values), F.evaluate(values))
+
+    def test_expressions_shared(self):
+        C = Circuit()
+        C.add('s0', Buffer())
+        for i in range(1, 41):
+            C.add('a%d' % i, ANDGate())
+            C.add('o%d' % i, ORGate())
+            C.add('s%d' % i, XORGate())
+            C.connect('s%d' % (i - 1), 'q', 'a%d' % i, 'a')
+            C.connect('s%d' % (i - 1), 'q', 'o%d' % i, 'a')
+            C.connect('a%d' % i, 'q', 's%d' % i, 'a')
+            C.connect('o%d' % i, 'q', 's%d' % i, 'b')
+            C.label_inputs('x%d' % i, ['a%d.b' % i, 'o%d.b' % i])
+        C.label_inputs('x0', ['s0.a'])
+        C.label_output('F', 's40.q')
+        F = C.expressions()['F']
+        self.assertTrue(len(F.compiled.cone(F.root)) < 400)
+        values = dict([('x%d' % i, i % 3 == 0) for i in range(41)])
+        self.assertEqual(F.evaluate(values), sum(values.values()) % 2 == 1)
+
+
+class TestGates(unittest.TestCase):
+    def setUp(self):
+        self.inputs = input_ids(5)
+
+    def test_input_ids(self):
+        self.assertEqual(input_ids(2), ['a', 'b'])
+        self.assertEqual(input_ids(28)[25:], ['z', 'aa', 'ab'])
+
+    def test_wide_gates(self):
+        gates = [(ANDGate(width=5), all), (ORGate(width=5), any),
+                 (NANDGate(width=5), lambda v: not all(v)),
+                 (NORGate(width=5), lambda v: not any(v)),
+                 (XORGate(width=5), lambda v: sum(v) % 2 == 1),
+                 (XNORGate(width=5), lambda v: sum(v) % 2 == 0)]
+        for values in binary_combinations(self.inputs):
+            for gate, function in gates:
+                gate.apply_inputs(values)
+                self.assertEqual(gate.get_output('q'),
+                    function(list(values.values())))
+
+    def test_parity_generator(self):
+        P = ParityGenerator(width=5)
+        for values in binary_combinations(self.inputs):
+            P.apply_inputs(values)
+            odd = sum(values.values()) % 2 == 1
+            self.assertEqual(P.get_output('o'), odd)
+            self.assertEqual(P.get_output('e'), not odd)
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, ANDGate, width=1)
+        self.assertRaises(NotImplementedError, Gate)
+        self.assertRaises(KeyError, ORGate().set_input, 'c', True)
+
+
+class TestBus(unittest.TestCase):
+    def setUp(self):
+        self.C = Circuit()
+        self.C.add('add', Adder(width=16))
+        self.C.add('cmp', Comparator(width=16))
+        self.C.add('split', Splitter(width=16))
+        self.C.add('parity', XORGate(width=16))
+        self.C.connect('add', 's', 'cmp', 'a')
+        self.C.connect('add', 's', 'split', 'a')
+        for i, inputid in enumerate(input_ids(16)):
+            self.C.connect('split', 'q%d' % i, 'parity', inputid)
+        self.C.label_inputs('a', ['add.a'])
+        self.C.label_inputs('b', ['add.b'])
+        self.C.label_inputs('c', ['add.ci'])
+        self.C.label_inputs('k', ['cmp.b'])
+        self.C.label_output('S', 'add.s')
+        self.C.label_output('V', 'add.co')
+        self.C.label_output('P', 'parity.q')
+        self.C.label_output('L', 'cmp.lt')
+
+    def test_datapath(self):
+        for a, b, c in [(0, 0, False), (1234, 4321, True), (65535, 1, False),
+                        (40000, 30000, True)]:
+            self.C.apply_inputs({'a': a, 'b': b, 'c': c, 'k': 5000})
+            total = a + b + int(c)
+            self.assertEqual(self.C.get_output('S'), total & 0xffff)
+            self.assertEqual(self.C.get_output('V'), total > 0xffff)
+            self.assertEqual(self.C.get_output('P'),
+                bin(total & 0xffff).count('1') % 2 == 1)
+            self.assertEqual(self.C.get_output('L'), total & 0xffff < 5000)
+
+    def test_joiner_multiplexer(self):
+        C = Circuit()
+        C.add('join', Joiner(width=4))
+        C.add('mux', Multiplexer(width=4))
+        C.add('not', BusInverter(width=4))
+        C.connect('join', 'q', 'mux', 'a')
+        C.connect('join', 'q', 'not', 'a')
+        C.connect('not', 'q', 'mux', 'b')
+        C.apply_inputs({'join.d0': True, 'join.d2': True, 'mux.s': False})
+        self.assertEqual(C.get_output('mux.q'), 5)
+        C.set_input('mux.s', True)
+        self.assertEqual(C.get_output('mux.q'), 10)
+
+    def test_register(self):
+        R = Register(width=8)
+        R.set_input('d', 0x1ab)
+        self.assertEqual(R.get_output('q'), 0)
+        R.set_input('clk', True)
+        self.assertEqual(R.get_output('q'), 0xab)
+        R.set_input('d', 7)
+        R.set_input('clk', False)
+        self.assertEqual(R.get_output('q'), 0xab)
+        R.set_input('clk', True)
+        self.assertEqual(R.get_output('q'), 7)
+
+
+class TestLUT(unittest.TestCase):
+    def setUp(self):
+        self.C = example_circuit()
+        self.F = [True, False, True, True] + [False] * 4
+
+    def test_from_expression(self):
+        F = BooleanExpression("((A' + B) * C + C' * D)'")
+        L = LUTDevice.from_expression(F)
+        self.assertEqual(L.inputs, ['a', 'b', 'c', 'd'])
+        for values in binary_combinations(['A', 'B', 'C', 'D']):
+            L.apply_inputs(dict(zip(L.inputs, [values[v] for v in 'ABCD'])))
+            self.assertEqual(L.get_output('q'), F.evaluate(values))
+
+    def test_from_circuit(self):
+        L = LUTDevice.from_circuit(self.C)
+        self.assertEqual(L.table, sum([1 << i for i in range(8) if self.F[i]]))
+        self.assertEqual(LUTDevice(self.F, 3).table, L.table)
+
+    def test_lut_map(self):
+        self.assertEqual(lut_map(self.C, k=3), 4)
+        self.assertEqual(self.C.devices, ['five'])
+        self.assertTrue(isinstance(self.C['five'], LUTDevice))
+        self.assertEqual(self.C.inputs, ['x', 'y', 'z'])
+        result = []
+        for values in binary_combinations(self.C.inputs):
+            self.C.apply_inputs(values)
+            result.append(self.C.get_output('F'))
+        self.assertEqual(result, self.F)
+
+
+class TestOptimize(unittest.TestCase):
+    def setUp(self):
+        self.C = Circuit()
+        self.C.add('zero', Logic0())
+        self.C.add('one', Logic1())
+        self.C.add('g1', ANDGate(width=3))
+        self.C.add('g2', ANDGate())
+        self.C.add('b1', Buffer())
+        self.C.add('n1', Inverter())
+        self.C.add('n2', Inverter())
+        self.C.add('o1', ORGate())
+        self.C.add('o2', ORGate(width=3))
+        self.C.add('d1', XORGate())
+        self.C.connect('one', 'q', 'g1', 'c')
+        self.C.connect('g1', 'q', 'b1', 'a')
+        self.C.connect('g2', 'q', 'n1', 'a')
+        self.C.connect('n1', 'q', 'n2', 'a')
+        self.C.connect('b1', 'q', 'o1', 'a')
+        self.C.connect('n2', 'q', 'o1', 'b')
+        self.C.connect('o1', 'q', 'o2', 'a')
+        self.C.connect('zero', 'q', 'o2', 'b')
+        self.C.label_inputs('x', ['g1.a', 'g2.a', 'd1.a'])
+        self.C.label_inputs('y', ['g1.b', 'g2.b'])
+        self.C.label_inputs('z', ['o2.c', 'd1.b'])
+        self.C.label_output('F', 'o2.q')
+
+    def function(self):
+        result = []
+        for values in binary_combinations(self.C.inputs):
+            self.C.apply_inputs(values)
+            result.append(self.C.get_output('F'))
+        return result
+
+    def test_propagate_constants(self):
+        self.assertEqual(propagate_constants(self.C), 2)
+        self.assertEqual(self.C['g1'].width, 2)
+        self.assertEqual(self.C['o2'].width, 2)
+        self.assertEqual(self.function(), [False, True] * 3 + [True] * 2)
+
+    def test_optimize(self):
+        report = optimize(self.C)
+        self.assertEqual(report['devices'], (10, 3))
+        self.assertEqual(report['collapse_buffers'], 2)
+        self.assertEqual(report['structural_hash'], 1)
+        self.assertEqual(sorted(self.C.devices), ['g1', 'o1', 'o2'])
+        self.assertEqual(self.C.inputs, ['x', 'y', 'z'])
+        self.assertEqual(self.C.outputs, ['F'])
+        self.assertEqual(self.function(), [False, True] * 3 + [True] * 2)
+
+    def test_preserve_labels(self):
+        self.C.connect('zero', 'q', 'd1', 'b')
+        self.C.replace('d1', ANDGate())
+        self.C.label_inputs('w', ['d1.a'])
+        self.assertEqual(propagate_constants(self.C), 2)
+        self.assertEqual(remove_dead_logic(self.C), 2)
+        self.assertTrue('d1' in self.C.devices)
+        self.assertEqual(self.C.inputs, ['w', 'x', 'y', 'z'])
+
+
+class TestAIG(unittest.TestCase):
+    def setUp(self):
+        self.C = example_circuit()
+        self.F = [True, False, True, True] + [False] * 4
+
+    def test_expression(self):
+        A = AIG.from_expression(BooleanExpression("((A' + B) * C + C' * D)'"))
+        self.assertEqual(A.inputs, ['A', 'B', 'C', 'D'])
+        result = []
+        for values in binary_combinations(A.inputs):
+            result.append(A.evaluate(values)['F'])
+        self.assertEqual(result, [True, False, False, False, True, False,
+            False, False, True, False, True, True, True, False, False, False])
+        nodes = len(A)
+        A.add_expression(BooleanExpression("(A' + B) * C"))
+        self.assertEqual(len(A), nodes)
+
+    def test_circuit(self):
+        A = AIG.from_circuit(self.C)
+        self.assertEqual(A.inputs, ['x', 'y', 'z'])
+        self.assertEqual(A.outputs, ['F'])
+        words = {'x': 0xf0, 'y': 0xcc, 'z': 0xaa}
+        F = A.simulate(words, width=8)['F']
+        self.assertEqual([bool(F >> i & 1) for i in range(8)], self.F)
+
+    def test_to_circuit(self):
+        C = AIG.from_circuit(self.C).to_circuit()
+        self.assertEqual(C.inputs, ['x', 'y', 'z'])
+        result = []
+        for values in binary_combinations(C.inputs):
+            C.apply_inputs(values)
+            result.append(C.get_output('F'))
+        self.assertEqual(result, self.F)
+        self.C.connect('five', 'q', 'one', 'a')
+        self.assertRaises(ValueError, AIG.from_circuit, self.C)
+
+    def test_nested(self):
+        D = Circuit()
+        D.add('sub', self.C)
+        D.add('inv', Inverter())
+        D.connect('sub', 'F', 'inv', 'a')
+        D.label_output('G', 'inv.q')
+        A = AIG.from_circuit(D)
+        self.assertEqual(A.inputs, ['sub.x', 'sub.y', 'sub.z'])
+        words = {'sub.x': 0xf0, 'sub.y': 0xcc, 'sub.z': 0xaa}
+        G = A.simulate(words, width=8)['G']
+        self.assertEqual([not (G >> i & 1) for i in range(8)], self.F)
+        self.assertEqual(D.expressions()['G'].evaluate(
+            {'sub.x': False, 'sub.y': False, 'sub.z': False}), not self.F[0])
+
+
+class TestSAT(unittest.TestCase):
+    def setUp(self):
+        self.C = example_circuit()
+
+    def test_solver(self):
+        S = Solver()
+        for clause in [[1, 2], [-1, 3], [-2, 3], [-3, 4], [-4, -1]]:
+            S.add_clause(clause)
+        self.assertTrue(S.solve())
+        self.assertEqual((S.model[2], S.model[3], S.model[4]), (True,) * 3)
+        S.add_clause([-4, 1])
+        self.assertFalse(S.solve())
+
+    def test_satisfiable(self):
+        self.assertFalse(is_satisfiable(BooleanExpression("A * B * (A' + B')")))
+        F = BooleanExpression("(A + B') * (A' + C) * B")
+        self.assertEqual(satisfying_assignment(F),
+                         {'A': True, 'B': True, 'C': True})
+
+    def test_shared(self):
+        C = Circuit()
+        for i in range(40):
+            C.add('g%d' % i, XORGate())
+            if i:
+                C.connect('g%d' % (i - 1), 'q', 'g%d' % i, 'a')
+        C.label_output('F', 'g39.q')
+        F = C.expressions()['F']
+        start = time.time()
+        self.assertTrue(is_satisfiable(F))
+        self.assertTrue(F.evaluate(satisfying_assignment(F)))
+        self.assertTrue(time.time() - start < 1.0)
+
+    def test_equivalent(self):
+        self.assertEqual(circuits_equivalent(self.C,
+            AIG.from_circuit(self.C).to_circuit()), (True, None))
+        D = AIG.from_circuit(self.C).to_circuit()
+        D.replace(D._outputs['F'].split('.')[0], NANDGate())
+        equivalent, values = circuits_equivalent(self.C, D)
+        self.assertFalse(equivalent)
+        self.C.apply_inputs(values)
+        D.apply_inputs(values)
+        self.assertNotEqual(self.C.get_output('F'), D.get_output('F'))
+
+    def test_wide(self):
+        C, D = Circuit(), Circuit()
+        C.add('and', ANDGate(width=64))
+        for i in range(63):
+            D.add('g%d' % i, ANDGate())
+            if i:
+                D.connect('g%d' % (i - 1), 'q', 'g%d' % i, 'a')
+        for i, inputid in enumerate(input_ids(64)):
+            C.label_inputs('i%d' % i, ['and.%s' % inputid])
+            D.label_inputs('i%d' % i, [i and 'g%d.b' % (i - 1) or 'g0.a'])
+        C.label_output('F', 'and.q')
+        D.label_output('F', 'g62.q')
+        self.assertEqual(circuits_equivalent(C, D), (True, None))
+
+
+class TestFault(unittest.TestCase):
+    def setUp(self):
+        self.C = example_circuit()
+
+    def test_collapse(self):
+        self.assertEqual(len(faults(self.C)), 26)
+        classes = collapse_faults(self.C)
+        self.assertEqual(len(classes), 8)
+        self.assertEqual(classes[('five.b', False)], [('five.b', False),
+            ('four.a', True), ('four.q', False), ('three.a', True),
+            ('three.b', True), ('three.q', True)])
+
+    def test_grade(self):
+        S = FaultSimulator(self.C)
+        R = S.grade(list(binary_combinations(self.C.inputs)), width=3)
+        self.assertEqual(R.coverage, 1.0)
+        self.assertEqual(R.detected[('one.a', False)], 6)
+        R = S.grade([{'x': False, 'y': True, 'z': False}, {'x': True}])
+        self.assertEqual(R.coverage, 0.375)
+        self.assertEqual(R.detected, {('five.q', False): 0,
+            ('five.a', True): 1, ('three.a', False): 1})
+
+    def test_uncollapsed(self):
+        S = FaultSimulator(self.C)
+        vectors = list(binary_combinations(self.C.inputs))
+        for fault in faults(self.C):
+            R = S.grade(vectors, faults=[fault])
+            D = Circuit()
+            for deviceid in self.C.devices:
+                D.add(deviceid, self.C[deviceid].__class__())
+            for connection in self.C._connections.keys():
+                D.connect(self.C._connections[connection][0],
+                    self.C._connections[connection][1], *connection)
+            D.add('stuck', fault[1] and Logic1() or Logic0())
+            if fault[0].endswith('.q'):
+                D.replace(fault[0].split('.')[0], D['stuck'], inputmap={})
+            else:
+                D.connect('stuck', 'q', *fault[0].split('.'))
+            D.label_output('F', 'five.q')
+            pins = [(label, dstinput) for label in self.C._inputs.keys() \
+                for dstinput in self.C._inputs[label] \
+                if dstinput in D._internal_inputs()]
+            detected = None
+            for i in range(len(vectors)):
+                self.C.apply_inputs(vectors[i])
+                for label, dstinput in pins:
+                    D.set_input(dstinput, vectors[i][label], internal=True)
+                if D.get_output('F') != self.C.get_output('F'):
+                    detected = i
+                    break
+            self.assertEqual(R.detected.get(fault), detected)
+
+
+class TestChannel(unittest.TestCase):
+    def setUp(self):
+        self.A = Circuit()
+        self.A.add('n', Inverter())
+        self.A.add('s', Sender())
+        self.A.connect('n', 'q', 's', 'a')
+        self.B = Circuit()
+        self.B.add('r', Receiver())
+        self.B.add('t', Receiver())
+        self.B.add('g', XORGate())
+        self.B.connect('r', 'q', 'g', 'a')
+        self.B.connect('t', 'q', 'g', 'b')
+        self.C = Circuit()
+        self.C.add('r', Receiver())
+
+    def test_fanout(self):
+        for receiver in [self.B['r'], self.B['t'], self.C['r']]:
+            self.A['s'].channel.attach(receiver)
+        self.assertEqual(len(self.A['s'].receivers), 3)
+        self.assertEqual(self.A['s'].receiver, self.B['r'])
+        for value in [False, True]:
+            self.A.set_input('n.a', value)
+            self.assertEqual(self.C.get_output('r.q'), not value)
+            self.assertEqual(self.B.get_output('r.q'), not value)
+            self.assertFalse(self.B.get_output('g.q'))
+        self.A['s'].receiver = self.C['r']
+        self.assertEqual(self.A['s'].receivers, [self.C['r']])
+        self.assertEqual(self.B['r'].sender, None)
+        del self.A['s'].receiver
+        self.assertEqual(self.C['r'].sender, None)
+
+    def test_batch(self):
+        self.A['s'].channel.attach(self.B['r'])
+        self.A['s'].channel.attach(self.B['t'])
+        updates = []
+        update = self.B._update
+        self.B._update = lambda: updates.append(update())
+        self.A.set_input('n.a', True)
+        self.assertEqual(len(updates), 1)
+        self.assertFalse(self.B.get_output('t.q'))
+
+    @unittest.skipIf(sys.version_info < (3, 2), 'requires setswitchinterval')
+    def test_threads(self):
+        errors = []
+
+        def simulate():
+            A, B = Circuit(), Circuit()
+            A.add('n', Inverter())
+            A.add('s', Sender())
+            A.connect('n', 'q', 's', 'a')
+            B.add('r', Receiver())
+            B.add('b', Buffer())
+            B.connect('r', 'q', 'b', 'a')
+            A['s'].receiver = B['r']
+            for i in range(3000):
+                A.set_input('n.a', bool(i & 1))
+                if B.get_output('b.q') == bool(i & 1):
+                    errors.append(i)
+
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            threads = [threading.Thread(target=simulate) for i in range(2)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            sys.setswitchinterval(interval)
+        self.assertEqual(errors, [])
+
+
+class FragileBuffer(Buffer):
+    """\
+    Buffer which fails (or stalls) on a true input, and optionally fails when
+    added to a circuit in another process.
+    """
+    def __init__(self, setup=False, stall=False):
+        super(FragileBuffer, self).__init__()
+        self.setup, self.stall = setup, stall
+        self.parent = os.getpid()
+
+    def _bounds(self):
+        if self.setup and os.getpid() != self.parent:
+            raise ValueError('added in a worker')
+        return super(FragileBuffer, self)._bounds()
+
+    def _update(self):
+        if self._inputs['a'] and self.stall:
+            time.sleep(2.0)
+        elif self._inputs['a']:
+            raise ValueError('true input')
+        super(FragileBuffer, self)._update()
+
+
+class ProbeBuffer(Buffer):
+    """\
+    Buffer which logs the ID of the process evaluating it, if a log queue is
+    set.
+    """
+    log = None
+
+    def __init__(self, name):
+        super(ProbeBuffer, self).__init__()
+        self.name = name
+
+    def _update(self):
+        if ProbeBuffer.log is not None:
+            ProbeBuffer.log.put((self.name, os.getpid()))
+        super(ProbeBuffer, self)._update()
+
+
+class TestParallel(unittest.TestCase):
+    def setUp(self):
+        self.C = Circuit()
+        self.C.add('n', Inverter())
+        self.C.add('s', Sender())
+        self.C.add('r', Receiver())
+        self.C.add('g', ANDGate())
+        self.C.add('o', ORGate())
+        self.C['s'].receiver = self.C['r']
+        self.C.connect('n', 'q', 's', 'a')
+        self.C.connect('r', 'q', 'g', 'a')
+        self.C.label_inputs('a', ['n.a'])
+        self.C.label_inputs('b', ['g.b', 'o.a'])
+        self.C.label_inputs('c', ['o.b'])
+        self.C.label_output('F', 'g.q')
+        self.C.label_output('G', 'o.q')
+
+    def test_partition(self):
+        self.assertEqual(sorted(partition(self.C, 3)),
+            [['g', 'r'], ['n', 's'], ['o']])
+        self.assertEqual(len(partition(self.C, 2)), 2)
+        self.assertEqual(len(partition(self.C, 8)), 5)
+
+    @unittest.skipIf(sys.version_info < (3, 8), 'requires shared_memory')
+    def test_parallel(self):
+        for i in range(4):
+            self.C.add('x%d' % i, XORGate())
+            if i:
+                self.C.connect('x%d' % (i - 1), 'q', 'x%d' % i, 'a')
+            self.C.label_inputs('d%d' % i, ['x%d.b' % i])
+        self.C.connect('o', 'q', 'x0', 'a')
+        self.C.label_output('H', 'x3.q')
+        with ParallelCircuit(self.C, processes=4, coverage=True) as P:
+            self.assertEqual(P.regions, 4)
+            self.assertEqual(P.inputs, self.C.inputs)
+            for values in binary_combinations(self.C.inputs):
+                P.apply_inputs(values)
+                self.C.apply_inputs(values)
+                for outputid in self.C.outputs:
+                    self.assertEqual(P.get_output(outputid),
+                        self.C.get_output(outputid))
+            coverage = P.coverage
+        self.assertEqual(coverage.nets, Coverage.from_circuit(self.C).nets)
+        self.assertEqual(coverage.report()['outputs']['H'], [False, True])
+        self.assertEqual(coverage.untoggled, ['n.q', 'r.q'])
+
+    @unittest.skipIf(sys.version_info < (3, 8), 'requires shared_memory')
+    def test_regions(self):
+        C = Circuit()
+        C.add('n', Inverter())
+        C.add('s', Sender())
+        C.add('r', Receiver())
+        C.connect('n', 'q', 's', 'a')
+        C['s'].receiver = C['r']
+        for i in range(5):
+            C.add('p%d' % i, ProbeBuffer('p%d' % i))
+            C.connect(i and 'p%d' % (i - 1) or 'r', 'q', 'p%d' % i, 'a')
+        C.label_inputs('a', ['n.a'])
+        C.label_output('F', 'p4.q')
+        ProbeBuffer.log = multiprocessing.Queue()
+        try:
+            with ParallelCircuit(C, processes=2) as P:
+                for i in range(10):
+                    P.set_input('a', bool(i & 1))
+                    self.assertEqual(P.get_output('F'), not i & 1)
+            processes = {}
+            while True:
+                try:
+                    name, pid = ProbeBuffer.log.get(timeout=1.0)
+                except Exception:
+                    break
+                processes.setdefault(name, set()).add(pid)
+        finally:
+            ProbeBuffer.log = None
+        self.assertEqual(sorted(processes.keys()),
+                         ['p%d' % i for i in range(5)])
+        self.assertEqual(len(set.union(*processes.values())), 1)
+
+    @unittest.skipIf(sys.version_info < (3, 8), 'requires shared_memory')
+    def test_worker_error(self):
+        C = Circuit()
+        C.add('f', FragileBuffer())
+        C.label_inputs('a', ['f.a'])
+        with ParallelCircuit(C, processes=1) as P:
+            try:
+                P.set_input('a', True)
+                self.fail('worker error not raised')
+            except RuntimeError as error:
+                self.assertTrue('true input' in str(error))
+            P.set_input('a', False)
+            self.assertEqual(P.get_output('f.q'), False)
+
+    @unittest.skipIf(sys.version_info < (3, 8), 'requires shared_memory')
+    def test_worker_setup(self):
+        C = Circuit()
+        C.add('f', FragileBuffer(setup=True))
+        start = time.time()
+        try:
+            ParallelCircuit(C, processes=1)
+            self.fail('worker setup error not raised')
+        except RuntimeError as error:
+            self.assertTrue('added in a worker' in str(error))
+        self.assertTrue(time.time() - start < 10.0)
+
+    @unittest.skipIf(sys.version_info < (3, 8), 'requires shared_memory')
+    def test_worker_timeout(self):
+        C = Circuit()
+        C.add('f', FragileBuffer(stall=True))
+        C.label_inputs('a', ['f.a'])
+        P = ParallelCircuit(C, processes=1, timeout=0.5)
+        self.assertRaises(RuntimeError, P.apply_inputs, {'a': True})
+        P.close()
+        P = ParallelCircuit(self.C, processes=2)
+        P._workers[0].terminate()
+        P._workers[0].join()
+        self.assertRaises(RuntimeError, P.apply_inputs, {'a': True})
+        P.close()
+
+
+class TestCoverage(unittest.TestCase):
+    def setUp(self):
+        self.C = Circuit()
+        self.C.add('one', Inverter())
+        self.C.add('two', ANDGate())
+        self.C.add('three', Logic1())
+        self.C.connect('one', 'q', 'two', 'a')
+        self.C.connect('three', 'q', 'two', 'b')
+        self.C.label_inputs('x', ['one.a'])
+        self.C.label_output('F', 'two.q')
+        self.C.coverage = Coverage.from_circuit(self.C)
+
+    def test_toggle(self):
+        self.C.set_input('x', True)
+        self.assertEqual(self.C.coverage.untoggled, self.C.coverage.nets)
+        self.assertTrue(self.C.coverage.fell('one.q'))
+        self.assertFalse(self.C.coverage.rose('one.q'))
+        self.C.set_input('x', False)
+        self.assertEqual(self.C.coverage.untoggled, ['three.q'])
+        report = self.C.coverage.report()
+        self.assertEqual((report['nets'], report['rises'], report['falls']),
+                         (3, 2, 2))
+        self.assertEqual(report['inputs'], {'x': [False, True]})
+        self.assertEqual(report['outputs'], {'F': [False, True]})
+
+    def test_settled(self):
+        C = Circuit()
+        C.add('xor', XORGate())
+        C.add('and', ANDGate())
+        C.label_inputs('x', ['xor.a', 'xor.b'])
+        C.label_inputs('a', ['and.a'])
+        C.label_inputs('b', ['and.b'])
+        C.label_output('F', 'xor.q')
+        C.label_output('G', 'and.q')
+        C.coverage = Coverage.from_circuit(C)
+        C.set_input('x', True)
+        C.set_input('x', False)
+        report = C.coverage.report()
+        self.assertEqual(report['outputs']['F'], [False])
+        self.assertEqual(report['inputs']['x'], [False, True])
+        C.coverage = Coverage.from_circuit(C)
+        C.apply_inputs({'a': True, 'b': True})
+        self.assertEqual(C.coverage.report()['outputs']['G'], [True])
+
+    def test_merge(self):
+        self.C.set_input('x', True)
+        other = Coverage(nets=['one.q', 'four.q'], outputs=['G'])
+        other.toggle(('one', 'q'), False, True)
+        other.toggle(('four', 'q'), True, False)
+        other.outputs['G'].add(True)
+        self.C.coverage.merge(other)
+        self.assertEqual(self.C.coverage.nets,
+                         ['four.q', 'one.q', 'three.q', 'two.q'])
+        self.assertTrue(self.C.coverage.rose('one.q'))
+        self.assertTrue(self.C.coverage.fell('four.q'))
+        self.assertEqual(self.C.coverage.untoggled,
+                         ['four.q', 'three.q', 'two.q'])
+        self.assertEqual(self.C.coverage.coverage, 0.5)
+
+
+@unittest.skipIf(sys.version_info < (3, 7), 'requires asyncio')
+class TestServer(unittest.TestCase):
+    def setUp(self):
+        self.C = Circuit()
+        self.C.add('one', Inverter())
+        self.C.add('two', ANDGate())
+        self.C.add('three', ORGate())
+        self.C.connect('one', 'q', 'two', 'a')
+        self.C.label_inputs('x', ['one.a', 'three.a'])
+        self.C.label_inputs('y', ['two.b', 'three.b'])
+        self.C.label_output('F', 'two.q')
+        self.C.label_output('G', 'three.q')
+        self.vectors = list(binary_combinations(['x', 'y']))
+        self.expected = [{'F': not x and y, 'G': x or y} \
+            for x, y in [(v['x'], v['y']) for v in self.vectors]]
+
+    def serve(self, path=None):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.server = SimulationServer(processes=1)
+        self.server.add('c', self.C)
+        self.loop.run_until_complete(self.server.start(path=path))
+        if path is None:
+            connection = SimulationClient.connect(port=self.server.address[1])
+        else:
+            connection = SimulationClient.connect(path=path)
+        return self.loop.run_until_complete(connection)
+
+    def tearDown(self):
+        if hasattr(self, 'loop'):
+            self.loop.run_until_complete(self.server.close())
+            self.loop.close()
+            asyncio.set_event_loop(None)
+
+    def test_apply(self):
+        client = self.serve()
+        run = self.loop.run_until_complete
+        self.assertEqual(run(client.info('c')), (['x', 'y'], ['F', 'G']))
+        results = run(asyncio.gather(*[client.apply_inputs('c', [vector]) \
+            for vector in self.vectors[:2]]))
+        self.assertEqual(results, [[result] for result in self.expected[:2]])
+        self.assertEqual(run(client.get_output('c')), {'F': True, 'G': True})
+        self.assertRaises(RuntimeError, run, client.info('d'))
+        self.assertEqual(run(client.apply_inputs('c', self.vectors)),
+                         self.expected)
+        self.assertTrue(self.C.get_output('G'))
+        run(client.close())
+
+    def test_bus_ports(self):
+        C = Circuit()
+        C.add('b', BusInverter(width=4))
+        server = SimulationServer()
+        self.assertRaises(ValueError, server.add, 'b', C)
+        D = Circuit()
+        D.add('j', Joiner(width=4))
+        self.assertRaises(ValueError, server.add, 'j', D)
+        D.add('s', Splitter(width=4))
+        D.connect('j', 'q', 's', 'a')
+        D.label_output('F', 's.q0')
+        server.add('j', D)
+
+    def test_connection_lost(self):
+        client = self.serve()
+        run = self.loop.run_until_complete
+        run(self.server.close())
+        self.assertRaises(ConnectionError, run,
+                          asyncio.wait_for(client.info('c'), 5.0))
+        self.assertRaises(ConnectionError, run,
+                          asyncio.wait_for(client.info('c'), 5.0))
+        run(client.close())
+
+    def test_sweep(self):
+        directory = tempfile.mkdtemp()
+        client = self.serve(os.path.join(directory, 'socket'))
+        run = self.loop.run_until_complete
+        self.assertEqual(run(client.sweep('c', self.vectors[1:])),
+                         self.expected[1:])
+        self.assertFalse(self.C.get_output('G'))
+        run(client.close())
+        os.remove(os.path.join(directory, 'socket'))
+        os.rmdir(directory)
+
+
+class TestSpatial(unittest.TestCase):
+    def setUp(self):
+        self.C = Circuit()
+        for i in range(10):
+            for j in range(10):
+                self.C.add('g%d%d' % (i, j), ANDGate(pos=(i * 50, j * 50)))
+
+    def test_index(self):
+        S = SpatialIndex(cell=10)
+        S.insert('a', (0, 0, 15, 15))
+        S.insert('b', (20, 5, 10, 10))
+        self.assertEqual(S.query((10, 10, 15, 15)), set(['a', 'b']))
+        self.assertEqual(S.at((25, 10)), set(['b']))
+        S.insert('b', (200, 200, 10, 10))
+        self.assertEqual(S.at((25, 10)), set())
+        S.remove('a')
+        self.assertEqual(len(S), 1)
+
+    def test_devices_in_rect(self):
+        self.assertEqual(self.C.devices_in_rect(60, 60, 70, 20),
+                         ['g11', 'g21'])
+        self.assertEqual(self.C.device_at((215, 230)), 'g44')
+        self.assertEqual(self.C.device_at((245, 230)), None)
+
+    def test_bounds(self):
+        S = SpatialIndex(cell=10)
+        self.assertEqual(S.bounds(), None)
+        S.insert('a', (0, 0, 10, 10))
+        S.insert('b', (0, 20, 10, 10))
+        S.insert('c', (-5, 5, 1000, 10))
+        self.assertEqual(S.bounds(), (-5, 0, 1000, 30))
+        self.assertEqual(S.at((900, 10)), set(['c']))
+        S.remove('c')
+        self.assertEqual(S.bounds(), (0, 0, 10, 30))
+        S.insert('a', (0, 10, 10, 10))
+        self.assertEqual(S.bounds(), (0, 10, 10, 20))
+        S.remove('a')
+        S.remove('b')
+        self.assertEqual(S.bounds(), None)
+
+    def test_nested_scaling(self):
+        times = []
+        for count in (1000, 4000):
+            C, D = Circuit(), Circuit()
+            C.add('sub', D)
+            start = time.time()
+            for i in range(count):
+                D.add('g%d' % i, ANDGate(pos=(i % 100 * 50, i // 100 * 50)))
+            for i in range(0, count, 10):
+                D['g%d' % i].pos = (i % 97 * 50, i // 97 * 50)
+            times.append(time.time() - start)
+            self.assertEqual(C.device_at((25, 25)), 'sub')
+        self.assertTrue(times[1] < 10 * times[0])
+
+    def test_move(self):
+        self.C['g44'].pos = (1000, 1000)
+        self.assertEqual(self.C.device_at((215, 230)), None)
+        self.assertEqual(self.C.device_at((1010, 1010)), 'g44')
+        self.C.remove('g44')
+        self.assertEqual(self.C.device_at((1010, 1010)), None)
+        self.assertEqual(len(self.C.devices_in_rect(0, 0, 1000, 1000)), 99)
+
+    def test_nested(self):
+        sub = Circuit()
+        sub.add('g', ANDGate(pos=(2000, 2000)))
+        self.C.add('sub', sub)
+        self.assertEqual(self.C.devices_in_rect(2010, 2010, 10, 10), ['sub'])
+        self.assertEqual(self.C.devices_in_rect(0, 0, 10, 10), ['g00'])
+        sub['g'].pos = (3000, 3000)
+        sub.add('h', ANDGate(pos=(4000, 4000)))
+        self.assertEqual(self.C.device_at((2010, 2010)), None)
+        self.assertEqual(self.C.device_at((3500, 3500)), 'sub')
+        sub.remove('h')
+        self.assertEqual(self.C.device_at((3500, 3500)), None)
+
+
+class TestImport(unittest.TestCase):
+    def modules(self, statement):
+        return subprocess.check_output([sys.executable, '-c',
+            '%s; import sys; print(" ".join(sys.modules.keys()))' \
+            % statement]).decode().split()
+
+    def test_headless(self):
+        modules = self.modules('import dilo.device, dilo.devices.gates, '
+                               'dilo.devices.basic, dilo.boolean')
+        for module in ['pyparsing', 'gtk', 'cairo', 'dilo.interface',
+                       'dilo.aig', 'dilo.sat', 'multiprocessing', 'asyncio']:
+            self.assertFalse(module in modules)
+
+    def test_import_time(self):
+        elapsed = float(subprocess.check_output([sys.executable, '-c',
+            'import time; start = time.time(); import dilo.device, '
+            'dilo.devices.gates, dilo.devices.basic, dilo.boolean; '
+            'print(time.time() - start)']).decode())
+        self.assertTrue(elapsed < 0.5, 'headless import took %.3f s' % elapsed)
+
+    @unittest.skipIf(sys.version_info < (3, 7), 'requires module __getattr__')
+    def test_lazy(self):
+        modules = self.modules('import dilo')
+        self.assertEqual([module for module in modules \
+            if module.startswith('dilo')], ['dilo'])
+        modules = self.modules('import dilo; dilo.devices.gates.ANDGate')
+        self.assertTrue('dilo.devices.gates' in modules)
+        self.assertFalse('dilo.devices.lut' in modules)
+
+
+class TestBoolean(unittest.TestCase):
+    def test_variables(self):
+        names = ['x%d' % i for i in range(60)] + ['carry_in']
+        E = BooleanExpression(' + '.join(names))
+        self.assertEqual(E.variables, sorted(names))
+        values = dict([(name, False) for name in names])
+        self.assertFalse(E.evaluate(values))
+        values['carry_in'] = True
+        self.assertTrue(E.evaluate(values))
+
+    def test_cache(self):
+        first = BooleanExpression('a0 * b0 + a0\' * c0')
+        second = BooleanExpression('a0 * b0 + a0\' * c0')
+        self.assertTrue(first.compiled is second.compiled)
+        self.assertEqual(intern_variable('a0'),
+            intern_variable('a0'))
+
+    def test_hash_consing(self):
+        C = BooleanExpression('(a * b + c) * (b * a + c) + d * d\'')
+        self.assertEqual(C.compiled.render(), '((a * b) + c)')
+        self.assertEqual(len(C.compiled.cone()), 5)
+        self.assertEqual(BooleanExpression('a + a\'').compiled.render(),
+            '1')
+        self.assertFalse(BooleanExpression('a * 0').evaluate({}))
+
+    def test_nested_parse(self):
+        text = 'a'
+        for i in range(12):
+            text = "(%s + b%d)'" % (text, i)
+        start = time.time()
+        E = BooleanExpression(text)
+        E.parse()
+        self.assertTrue(time.time() - start < 1.0)
+        self.assertEqual(len(E.variables), 13)
+
 
 class TestTruth(unittest.TestCase):
     def setUp(self):